@@ -1,10 +1,21 @@
 import streamlit as st
-import pandas as pd
-import random
+import numpy as np
 import requests
-import io
 import time
-import datetime
+import functools
+import streamlit.components.v1 as components
+
+from bank_source import CircuitOpenError, bank_cache
+from exam_timer import ExamDeadline, countdown_html, log_result
+from question_bank import question_store
+from fragments import fragments_for
+from memory_dashboard import admin_requested, render_memory_dashboard
+from rerun_metrics import rerun_timer
+from scoring import AnswerSheet, grade
+
+# Phase timings of this rerun (a no-op unless metrics are enabled, see rerun_metrics.py)
+timer = rerun_timer('practice')
+timer.phase('css')
 
 # Security headers and configuration
 st.set_page_config(
@@ -14,6 +25,11 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Admin-only memory dashboard (?admin=<QUIZ_ADMIN_TOKEN>), served instead of the quiz
+if admin_requested():
+    render_memory_dashboard()
+    st.stop()
+
 # Add dark mode compatible CSS
 st.markdown("""
 <style>
@@ -65,24 +81,6 @@ st.markdown("""
         color: var(--text-color);
     }
     
-    /* Timer styling */
-    .timer-container {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        border-radius: 10px;
-        padding: 15px;
-        margin: 10px 0;
-        color: white;
-        text-align: center;
-        font-weight: bold;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-    }
-    .timer-warning {
-        background: linear-gradient(135deg, #ff6b6b 0%, #ee5a24 100%);
-    }
-    .timer-critical {
-        background: linear-gradient(135deg, #ff0000 0%, #8b0000 100%);
-    }
-    
     /* Dark mode variables */
     @media (prefers-color-scheme: dark) {
         :root {
@@ -176,29 +174,40 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Detailed results are shown a page at a time
+RESULTS_PER_PAGE = 10
+RESULTS_FILTERS = {
+    "All questions": lambda score: np.ones(len(score.correct), dtype=bool),
+    "Incorrect only": lambda score: ~score.correct,
+    "Unanswered only": lambda score: ~score.answered,
+}
+
 # Initialize ALL session state variables at the beginning
 def initialize_session_state():
     """Initialize all session state variables"""
     if 'initialized' not in st.session_state:
         st.session_state.initialized = True
         st.session_state.current_q = 0
-        st.session_state.user_answers = {}
-        st.session_state.shuffled_options = {}
+        # Answers, option order and checked flags as compact arrays (scoring.AnswerSheet)
+        st.session_state.answer_sheet = None
         st.session_state.quiz_completed = False
         st.session_state.quiz_submitted = False
-        st.session_state.scenario_groups = {}
         st.session_state.loading_shown = False
         st.session_state.questions_loaded = False
-        st.session_state.questions_df = pd.DataFrame()
+        st.session_state.bank_version = None  # ID of the shared bank in question_store
         # Timer variables
         st.session_state.exam_started = False
-        st.session_state.exam_start_time = None
+        st.session_state.exam_deadline = None  # ExamDeadline, the authoritative clock
         st.session_state.exam_duration = 3 * 60 * 60  # 3 hours in seconds
         st.session_state.time_up = False
         st.session_state.auto_submitted = False
         st.session_state.last_timer_update = 0
+        # Results page state
+        st.session_state.results_page = 0
+        st.session_state.results_celebrated = False
 
 # Call initialization function
+timer.phase('session_state')
 initialize_session_state()
 
 # Timer functions
@@ -206,47 +215,83 @@ def start_exam_timer():
     """Start the exam timer"""
     if not st.session_state.exam_started:
         st.session_state.exam_started = True
-        st.session_state.exam_start_time = time.time()
+        deadline = ExamDeadline(st.session_state.exam_duration)
+        deadline.sheet = get_answer_sheet()
+        # Graded (and logged) in the background at the deadline even if this tab is never seen again
+        deadline.close_at_deadline(functools.partial(grade_final, deadline, log=True))
+        st.session_state.exam_deadline = deadline
         st.session_state.time_up = False
         st.session_state.auto_submitted = False
 
+def grade_final(deadline, log=False):
+    """Grade the session's current sheet as the exam closes (may run on the scheduler thread)"""
+    sheet = deadline.sheet
+    report = grade(sheet.bank, sheet.codes.copy())
+    if log:
+        log_result({
+            'started_at': deadline.started_at,
+            'closed_at': time.time(),
+            'bank_version': report.bank_version,
+            'answered': report.answered_count,
+            'correct': report.correct_count,
+            'total': report.total,
+            'percentage': round(report.percentage, 1),
+        })
+    return report
+
+def close_exam():
+    """Freeze this attempt so no further answers are recorded"""
+    deadline = st.session_state.exam_deadline
+    if deadline is not None:
+        deadline.sheet = get_answer_sheet()
+        deadline.close(functools.partial(grade_final, deadline))
+
+def expire_exam():
+    """Stop the exam and submit whatever was answered before the deadline"""
+    close_exam()
+    st.session_state.time_up = True
+    if not st.session_state.auto_submitted and not st.session_state.quiz_submitted:
+        st.session_state.auto_submitted = True
+        st.session_state.quiz_submitted = True
+
 def get_remaining_time():
     """Calculate remaining time"""
     if not st.session_state.exam_started or st.session_state.time_up:
         return 0
     
-    elapsed = time.time() - st.session_state.exam_start_time
-    remaining = st.session_state.exam_duration - elapsed
+    remaining = st.session_state.exam_deadline.remaining()
     
     if remaining <= 0:
-        st.session_state.time_up = True
-        if not st.session_state.auto_submitted and not st.session_state.quiz_submitted:
-            st.session_state.auto_submitted = True
-            st.session_state.quiz_submitted = True
+        expire_exam()
         return 0
     
     return remaining
 
-def format_time(seconds):
-    """Format seconds into HH:MM:SS"""
-    if seconds <= 0:
-        return "00:00:00"
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+def answers_accepted():
+    """Whether the server-side deadline still accepts answers and submissions"""
+    deadline = st.session_state.exam_deadline
+    return deadline is None or deadline.accepts()
+
+def record_answer(q, option):
+    """Record an option index unless the exam has closed in the meantime"""
+    deadline = st.session_state.exam_deadline
+    if deadline is None:
+        get_answer_sheet().set_code(q, option)
+        return True
+    # Under the deadline's lock, so the scheduler cannot close the exam halfway through
+    return deadline.record(get_answer_sheet().set_code, q, option)
 
 # Add refresh button and title in the same row
+timer.phase('load')
 col1, col2 = st.columns([3, 1])
 with col1:
     st.title("Initial and Periodic Inspection and Testing of Electrical Installations (2391-052)")
 with col2:
     if st.button("🔄 Refresh Questions", type="secondary"):
-        # Clear cache and reset ONLY what's necessary
-        st.cache_data.clear()
+        # Revalidate the shared bank and reset ONLY what's necessary
+        bank_cache.refresh()
         st.session_state.questions_loaded = False
-        st.session_state.questions_df = pd.DataFrame()
-        st.session_state.scenario_groups = {}
+        st.session_state.bank_version = None
         st.rerun()
 
 # Show loading message only when actually loading
@@ -255,57 +300,36 @@ if not st.session_state.questions_loaded and not st.session_state.loading_shown:
     loading_placeholder.info("🔄 Loading questions...")
     st.session_state.loading_shown = True
 
-# Configuration with shorter cache time - UPDATED SECURE VERSION
-@st.cache_data(ttl=300)
+# Question bank is cached process-wide and revalidated in the background
 def load_questions_data():
-    # Try Google Sheets first
-    SHEET_URL = "https://docs.google.com/spreadsheets/d/1OhPzpNeKII4Fn1UQCQQvjFTjkiMtma-fPfY2eVIOi4c/edit?usp=sharing"
-    
     try:
-        # Convert Google Sheets URL to CSV export URL
-        csv_url = SHEET_URL.replace('/edit?usp=sharing', '/export?format=csv')
-        
-        # Add timeout and better error handling for production
-        response = requests.get(csv_url, timeout=10)
-        response.raise_for_status()
-        
-        # Read CSV data
-        questions_df = pd.read_csv(io.StringIO(response.content.decode('utf-8')))
-        questions_df = questions_df.fillna('')
+        snapshot = bank_cache.get()
         
-        # Validate required columns exist
-        required_columns = ['Question', 'OptionA', 'OptionB', 'OptionC', 'OptionD', 'CorrectAnswer']
-        missing_columns = [col for col in required_columns if col not in questions_df.columns]
-        
-        if missing_columns:
-            st.error(f"Missing required columns: {missing_columns}")
-            return pd.DataFrame()
+        if snapshot.source == 'snapshot':
+            st.warning("Google Sheets is unavailable - showing the last saved copy of the questions.")
             
-        return questions_df
+        return snapshot.bank
     
     except requests.exceptions.Timeout:
         st.error("Timeout loading questions from Google Sheets. Please try again.")
-        return pd.DataFrame()
-    except requests.exceptions.RequestException as e:
+        return None
+    except (requests.exceptions.RequestException, CircuitOpenError) as e:
         st.error(f"Network error loading questions: {e}")
-        # Fallback to local Excel file
-        try:
-            questions_df = pd.read_excel("2391-052_practice.xlsx")
-            questions_df = questions_df.fillna('')
-            return questions_df
-        except Exception as e2:
-            st.error(f"Failed to load questions from both sources: {e2}")
-            return pd.DataFrame()
+        return None
     except Exception as e:
+        # Includes banks rejected by the compiler, e.g. missing required columns
         st.error(f"Unexpected error: {e}")
-        return pd.DataFrame()
+        return None
+
+# Sessions only hold the version ID; the bank itself is shared process-wide
+bank = question_store.get(st.session_state.bank_version)
 
-# Load questions only if not already loaded
-if not st.session_state.questions_loaded or st.session_state.questions_df.empty:
-    questions_df = load_questions_data()
+# Load questions only if not already loaded (or the version was evicted)
+if not st.session_state.questions_loaded or bank is None:
+    bank = load_questions_data()
     
-    if not questions_df.empty:
-        st.session_state.questions_df = questions_df
+    if bank is not None and len(bank) > 0:
+        st.session_state.bank_version = bank.version
         st.session_state.questions_loaded = True
         
         # Clear loading message after data is loaded
@@ -316,14 +340,26 @@ if not st.session_state.questions_loaded or st.session_state.questions_df.empty:
         st.error("No questions could be loaded. Please check your data source.")
         st.stop()
 
-# Use the questions from session state
-questions_df = st.session_state.questions_df
-num_questions = len(questions_df)
+num_questions = len(bank)
+
+def get_answer_sheet():
+    """Return this session's answer sheet, carrying answers over to a new bank version"""
+    sheet = st.session_state.answer_sheet
+    if sheet is not None and sheet.tracks(bank):
+        return sheet
+    # The sheet holds on to its own bank, so its answers can always be carried over
+    sheet = AnswerSheet(bank) if sheet is None else sheet.rebased(sheet.bank, bank)
+    st.session_state.answer_sheet = sheet
+    # A running exam grades whichever sheet the session holds when it closes
+    if st.session_state.exam_deadline is not None:
+        st.session_state.exam_deadline.sheet = sheet
+    return sheet
 
 # Show last update time (stays visible)
 st.caption(f"Questions: {num_questions} | Last updated: {time.strftime('%H:%M:%S')}")
 
 # --- Exam Timer Display ---
+timer.phase('timer')
 if not st.session_state.quiz_submitted:
     remaining_time = get_remaining_time()
     
@@ -339,256 +375,198 @@ if not st.session_state.quiz_submitted:
             start_exam_timer()
             st.rerun()
     else:
-        # Display timer with appropriate styling
-        timer_class = "timer-container"
-        if remaining_time < 1800:  # 30 minutes
-            timer_class += " timer-warning"
-        if remaining_time < 600:   # 10 minutes
-            timer_class += " timer-critical"
-        
-        timer_html = f"""
-        <div class="{timer_class}">
-            <div style="font-size: 1.1em;">⏰ EXAM TIME REMAINING</div>
-            <div style="font-size: 1.8em; margin: 10px 0;">{format_time(remaining_time)}</div>
-            <div style="font-size: 0.9em;">3 Hour Time Limit</div>
-        </div>
-        """
-        st.markdown(timer_html, unsafe_allow_html=True)
-
-# --- Pre-process scenario groups ---
-def build_scenario_groups(df):
-    scenario_groups = {}
-    for idx, row in df.iterrows():
-        scenario = str(row.get('Scenario', '')).strip()
-        if scenario and scenario != 'nan' and scenario != '':
-            if scenario not in scenario_groups:
-                scenario_groups[scenario] = []
-            scenario_groups[scenario].append(idx)
-    return scenario_groups
-
-# Build scenario groups if not already built
-if not st.session_state.scenario_groups:
-    st.session_state.scenario_groups = build_scenario_groups(questions_df)
-
-# --- Current question ---
-i = st.session_state.current_q
-
-# Check if we have a valid question index
-if i >= len(questions_df):
-    st.session_state.current_q = 0
-    i = 0
-    st.rerun()
-
-row = questions_df.iloc[i]
-
-# --- Check if this is the last question ---
-is_last_question = i == num_questions - 1
-
-# --- Shuffle options only once per question ---
-if i not in st.session_state.shuffled_options:
-    options = [str(row['OptionA']), str(row['OptionB']), str(row['OptionC']), str(row['OptionD'])]
-    # Filter out empty options
-    options = [opt for opt in options if opt and opt != 'nan']
-    shuffled_options = random.sample(options, len(options))
-    st.session_state.shuffled_options[i] = shuffled_options
-
-shuffled_options = st.session_state.shuffled_options[i]
-
-# --- Display Question Header FIRST ---
-st.subheader(f"Question {i+1} of {num_questions}")
-
-# --- Display Scenario (if available) ---
-current_scenario = str(row.get('Scenario', '')).strip()
-current_scenario_indices = []
-current_scenario_position = 0
-total_scenario_questions = 0
-
-if current_scenario and current_scenario != 'nan' and current_scenario != '':
-    # Get scenario indices from pre-built groups
-    current_scenario_indices = st.session_state.scenario_groups.get(current_scenario, [])
-    
-    if current_scenario_indices:
-        try:
-            current_scenario_position = current_scenario_indices.index(i) + 1
-            total_scenario_questions = len(current_scenario_indices)
-            
-            # Split scenario into paragraphs
-            scenario_paragraphs = [p.strip() for p in current_scenario.split('\n') if p.strip()]
-            
-            # Build scenario HTML
-            scenario_html = '''
-            <div class="scenario-container">
-                <div class="scenario-header">📖 SCENARIO</div>
-            '''
-            
-            for paragraph in scenario_paragraphs:
-                scenario_html += f'<div class="scenario-content">{paragraph}</div>'
-            
-            scenario_html += f'<div class="scenario-progress">Scenario Question {current_scenario_position} of {total_scenario_questions}</div>'
-            scenario_html += '</div>'
-            
-            st.markdown(scenario_html, unsafe_allow_html=True)
-        except Exception as e:
-            st.warning("Could not load scenario information")
-
-# --- Display the actual question with paragraph support ---
-st.write("**Question:**")
-question_text = str(row['Question'])
-
-# Split question into paragraphs and display each as separate markdown
-question_paragraphs = [p.strip() for p in question_text.split('\n') if p.strip()]
-
-# Display question in a styled container
-question_html = '<div class="question-container">'
-for paragraph in question_paragraphs:
-    question_html += f'<div class="question-paragraph">{paragraph}</div>'
-question_html += '</div>'
-
-st.markdown(question_html, unsafe_allow_html=True)
+        # Ticks in the browser; the server only checks the deadline when answers arrive
+        components.html(countdown_html(remaining_time, note="3 Hour Time Limit"), height=140)
+
+# Scenario and question HTML is rendered once per bank version and shared
+fragments = fragments_for(bank)
+
+# --- Navigation callbacks (run before the panel reruns) ---
+def go_to_question(q):
+    st.session_state.current_q = q
+
+def go_to_selected_question():
+    st.session_state.current_q = st.session_state.question_nav
+
+# --- Exam panel ---
+# Answering and navigating only change what is inside this fragment, so those
+# clicks rerun just the panel - not the CSS, loading and timer code above it.
+@st.fragment
+def exam_panel():
+    panel_timer = rerun_timer('practice', 'exam_panel')
+    panel_timer.phase('question')
+
+    # --- Deadline check ---
+    # The countdown runs in the browser, so the first click after time is up
+    # lands here: drop it and show the auto-submitted results instead
+    if not st.session_state.quiz_submitted and not answers_accepted():
+        expire_exam()
+        st.rerun()
 
-# --- Find the index of previously selected answer ---
-previous_answer = st.session_state.user_answers.get(i)
-if previous_answer is not None:
-    try:
-        selected_index = shuffled_options.index(previous_answer)
-    except ValueError:
-        selected_index = None
-else:
-    selected_index = None
-
-# --- Display radio button ---
-user_answer = st.radio("Choose your answer:", 
-                       shuffled_options, 
-                       index=selected_index,
-                       key=f"q{i}")
-
-# Store the selected option
-if user_answer is not None:
-    st.session_state.user_answers[i] = user_answer
-    # Auto-start timer when user starts answering
-    if not st.session_state.exam_started:
-        start_exam_timer()
+    # --- Current question ---
+    i = st.session_state.current_q
 
-# --- Navigation buttons ---
-col1, col2, col3 = st.columns([1, 1, 1])
-with col1:
-    if st.button("Previous", disabled=(i == 0)):
-        st.session_state.current_q -= 1
-        st.rerun()
-with col2:
-    if is_last_question:
-        if st.button("Next", disabled=True):
-            pass
-    else:
-        if st.button("Next"):
-            st.session_state.current_q += 1
+    # Check if we have a valid question index
+    if i >= num_questions:
+        st.session_state.current_q = 0
+        i = 0
+
+    # --- Check if this is the last question ---
+    is_last_question = i == num_questions - 1
+
+    # --- Shuffle options in a stable order per question ---
+    # The order is derived from the attempt seed on each render; option text stays in the shared bank
+    sheet = get_answer_sheet()
+    options = bank.options(i)
+    option_order = sheet.option_order(bank, i)
+
+    # --- Display Question Header FIRST ---
+    st.subheader(f"Question {i+1} of {num_questions}")
+
+    # --- Display Scenario (if available) ---
+    # Scenario groups, positions and sizes are precomputed once per bank version
+    current_scenario_id = bank.scenario_id[i]
+    current_scenario_indices = bank.scenario_members(i)
+
+    if current_scenario_id >= 0:
+        st.markdown(fragments.scenario(i, with_progress=True), unsafe_allow_html=True)
+
+    # --- Display the actual question with paragraph support ---
+    st.write("**Question:**")
+    st.markdown(fragments.question(i), unsafe_allow_html=True)
+
+    # --- Find the index of previously selected answer ---
+    previous_answer = sheet.answer(i)
+    selected_index = option_order.index(previous_answer) if previous_answer is not None else None
+
+    # --- Display radio button ---
+    user_answer = st.radio("Choose your answer:", 
+                           option_order, 
+                           index=selected_index,
+                           format_func=options.__getitem__,
+                           key=f"q{i}")
+
+    # Store the selected option (never after the deadline, even once submitted)
+    if user_answer is not None and record_answer(i, user_answer):
+        # Auto-start timer when user starts answering (full rerun to show the timer)
+        if not st.session_state.exam_started:
+            start_exam_timer()
             st.rerun()
-with col3:
-    answered_count = len(st.session_state.user_answers)
-    submit_disabled = answered_count == 0 or st.session_state.time_up
-    
-    submit_label = "Submit Quiz"
-    if st.session_state.time_up:
-        submit_label = "Time's Up!"
-    
-    if st.button(submit_label, type="primary", disabled=submit_disabled):
-        st.session_state.quiz_submitted = True
-        st.rerun()
 
-# --- Scenario Navigation ---
-if current_scenario_indices and len(current_scenario_indices) > 1:
-    st.write("---")
-    st.write("**Scenario Navigation:**")
-    
-    scenario_cols = st.columns(len(current_scenario_indices))
-    
-    for idx, q_idx in enumerate(current_scenario_indices):
-        with scenario_cols[idx]:
-            is_current_scenario_q = q_idx == i
-            is_answered = q_idx in st.session_state.user_answers
-            
-            label = f"Q{idx + 1}"
-            button_type = "primary" if is_current_scenario_q else "secondary"
-            
-            if st.button(label, key=f"scenario_nav_{current_scenario}_{q_idx}", type=button_type, use_container_width=True):
-                st.session_state.current_q = q_idx
-                st.rerun()
+    # --- Navigation buttons ---
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col1:
+        st.button("Previous", disabled=(i == 0), on_click=go_to_question, args=(i - 1,))
+    with col2:
+        st.button("Next", disabled=is_last_question, on_click=go_to_question, args=(i + 1,))
+    with col3:
+        answered_count = sheet.answered_count
+        submit_disabled = answered_count == 0 or st.session_state.time_up
+
+        submit_label = "Submit Quiz"
+        if st.session_state.time_up:
+            submit_label = "Time's Up!"
+
+        if st.button(submit_label, type="primary", disabled=submit_disabled):
+            close_exam()
+            st.session_state.quiz_submitted = True
+            # The results page lives outside this fragment
+            st.rerun()
 
-# --- Progress Section ---
-answered_count = len(st.session_state.user_answers)
-progress_percentage = answered_count / num_questions if num_questions > 0 else 0
+    # --- Scenario Navigation ---
+    panel_timer.phase('scenario_nav')
+    if len(current_scenario_indices) > 1:
+        st.write("---")
+        st.write("**Scenario Navigation:**")
 
-st.progress(progress_percentage)
-st.write(f"Progress: {answered_count}/{num_questions} questions answered")
-st.write(f"Current question: {i+1}/{num_questions}")
+        scenario_cols = st.columns(len(current_scenario_indices))
 
-# --- Useful Information Section ---
-st.write("---")
+        for idx, q_idx in enumerate(current_scenario_indices):
+            with scenario_cols[idx]:
+                is_current_scenario_q = q_idx == i
+                is_answered = sheet.is_answered(q_idx)
 
-# Use 4 columns for compact layout
-col_info1, col_info2, col_info3, col_info4 = st.columns(4)
+                label = f"Q{idx + 1}"
+                button_type = "primary" if is_current_scenario_q else "secondary"
 
-with col_info1:
-    completion_rate = (answered_count / num_questions) * 100 if answered_count > 0 else 0
-    st.metric("Completed", f"{completion_rate:.0f}%")
+                st.button(label, key=f"scenario_nav_{current_scenario_id}_{q_idx}", type=button_type,
+                          use_container_width=True, on_click=go_to_question, args=(q_idx,))
 
-with col_info2:
-    remaining = num_questions - answered_count
-    st.metric("Remaining", remaining)
+    # --- Progress Section ---
+    panel_timer.phase('progress')
+    answered_count = sheet.answered_count
+    progress_percentage = answered_count / num_questions if num_questions > 0 else 0
 
-with col_info3:
-    if is_last_question:
-        st.metric("Status", "Final")
-    elif answered_count == num_questions:
-        st.metric("Status", "Done")
-    else:
-        st.metric("Status", f"{i+1}/{num_questions}")
+    st.progress(progress_percentage)
+    st.write(f"Progress: {answered_count}/{num_questions} questions answered")
+    st.write(f"Current question: {i+1}/{num_questions}")
 
-with col_info4:
-    if answered_count == num_questions:
-        st.metric("Submit", "✅ Ready")
-    elif answered_count > 0:
-        st.metric("Submit", "🟡 Partial")
-    else:
-        st.metric("Submit", "❌ No")
+    # --- Useful Information Section ---
+    st.write("---")
 
-# --- Quick Stats ---
-if answered_count > 0:
-    st.info(f"📊 **Quick Stats**: You've answered {answered_count} questions. {remaining} questions remaining. You can submit anytime!")
-    
-    if answered_count < num_questions:
-        st.warning(f"⚠️ Note: You haven't answered all questions. You can still submit with {answered_count}/{num_questions} answered.")
-
-# --- Compact Question Navigator ---
-if not st.session_state.quiz_submitted:
-    questions_per_row = 10
-    num_rows = (num_questions + questions_per_row - 1) // questions_per_row
-    
-    for row_num in range(num_rows):
-        start_q = row_num * questions_per_row
-        end_q = min((row_num + 1) * questions_per_row, num_questions)
-        
-        cols = st.columns(questions_per_row)
-        
-        for col_idx, q_num in enumerate(range(start_q, end_q)):
-            with cols[col_idx]:
-                is_current = q_num == i
-                is_answered = q_num in st.session_state.user_answers
-                
-                has_scenario = False
-                scenario_value = str(questions_df.iloc[q_num].get('Scenario', ''))
-                if scenario_value.strip() and scenario_value != 'nan':
-                    has_scenario = True
-                
-                label = f"{q_num + 1}"
-                if has_scenario:
-                    label = f"📖{q_num + 1}"
-                
-                button_type = "primary" if is_current else "secondary"
-                
-                if st.button(label, key=f"nav_{q_num}", type=button_type, use_container_width=True):
-                    st.session_state.current_q = q_num
-                    st.rerun()
+    # Use 4 columns for compact layout
+    col_info1, col_info2, col_info3, col_info4 = st.columns(4)
+
+    with col_info1:
+        completion_rate = (answered_count / num_questions) * 100 if answered_count > 0 else 0
+        st.metric("Completed", f"{completion_rate:.0f}%")
+
+    with col_info2:
+        remaining = num_questions - answered_count
+        st.metric("Remaining", remaining)
+
+    with col_info3:
+        if is_last_question:
+            st.metric("Status", "Final")
+        elif answered_count == num_questions:
+            st.metric("Status", "Done")
+        else:
+            st.metric("Status", f"{i+1}/{num_questions}")
+
+    with col_info4:
+        if answered_count == num_questions:
+            st.metric("Submit", "✅ Ready")
+        elif answered_count > 0:
+            st.metric("Submit", "🟡 Partial")
+        else:
+            st.metric("Submit", "❌ No")
+
+    # --- Quick Stats ---
+    if answered_count > 0:
+        st.info(f"📊 **Quick Stats**: You've answered {answered_count} questions. {remaining} questions remaining. You can submit anytime!")
+
+        if answered_count < num_questions:
+            st.warning(f"⚠️ Note: You haven't answered all questions. You can still submit with {answered_count}/{num_questions} answered.")
+
+    # --- Compact Question Navigator ---
+    panel_timer.phase('navigator')
+    if not st.session_state.quiz_submitted:
+        # Base labels (with the 📖 scenario marker) are built once per bank version;
+        # only the answered bitmap comes from this session
+        base_labels = bank.derived('navigator_labels', lambda b: [
+            f"📖{q + 1}" if scenario_id >= 0 else f"{q + 1}" for q, scenario_id in enumerate(b.scenario_id)
+        ])
+        answered = sheet.answered()
+
+        st.write("**Question Navigator:**")
+        st.caption(f"📖 scenario question · ✅ answered | "
+                   f"{int(answered.sum())} answered, {num_questions - int(answered.sum())} unanswered")
+
+        # One radio component for the whole grid instead of one button per question
+        st.session_state.question_nav = i
+        st.radio(
+            "Go to question:",
+            range(num_questions),
+            format_func=lambda q: f"{base_labels[q]} ✅" if answered[q] else base_labels[q],
+            horizontal=True,
+            key="question_nav",
+            on_change=go_to_selected_question,
+            label_visibility="collapsed"
+        )
+    panel_timer.done()
+
+timer.phase('exam_panel')
+exam_panel()
 
 # --- Results page after submission ---
 if st.session_state.quiz_submitted:
@@ -596,40 +574,30 @@ if st.session_state.quiz_submitted:
     if st.session_state.time_up and st.session_state.auto_submitted:
         st.error("⏰ **TIME'S UP!** Your exam has been automatically submitted.")
     
-    # Calculate score
-    correct_count = 0
-    results = []
-    
-    for q_index in range(num_questions):
-        row = questions_df.iloc[q_index]
-        user_answer = st.session_state.user_answers.get(q_index, "Not answered")
-        correct_answer = str(row['CorrectAnswer'])
-        is_correct = user_answer == correct_answer
-        
-        if is_correct:
-            correct_count += 1
-        
-        results.append({
-            'Question Number': q_index + 1,
-            'Scenario': str(row.get('Scenario', '')),
-            'Question': str(row['Question']),
-            'Your Answer': user_answer,
-            'Correct Answer': correct_answer,
-            'Status': '✅ Correct' if is_correct else '❌ Incorrect'
-        })
+    # The grade taken when the exam closed; answers cannot change after that
+    timer.phase('grading')
+    deadline = st.session_state.exam_deadline
+    score = deadline.final_report if deadline is not None and deadline.closed else None
+    if score is None or score.bank_version != bank.version:
+        # Untimed, or the bank was refreshed since: graded once per answer state from the memo
+        score = get_answer_sheet().report(bank)
+    timer.phase('results')
+    correct_count = score.correct_count
     
-    # Calculate percentage
-    percentage_score = (correct_count / num_questions) * 100
+    percentage_score = score.percentage
     pass_threshold = 75
     
     # Display results
     st.write("## Quiz Submitted! Here are your results:")
     
-    answered_count = len(st.session_state.user_answers)
+    answered_count = get_answer_sheet().answered_count
     st.write(f"**Submission Summary**: You submitted with {answered_count}/{num_questions} questions answered.")
     
     if percentage_score >= pass_threshold:
-        st.balloons()
+        # Celebrate once, not on every results page change
+        if not st.session_state.results_celebrated:
+            st.session_state.results_celebrated = True
+            st.balloons()
         st.success(f"🎉 **CONGRATULATIONS!** 🎉")
         st.success(f"## Final Score: {correct_count}/{num_questions} ({percentage_score:.1f}%)")
         st.success("### 🏆 You have PASSED the assessment! 🏆")
@@ -647,68 +615,90 @@ if st.session_state.quiz_submitted:
     else:
         st.progress(percentage_score/100, text=f"FAILED - {percentage_score:.1f}% (Need {pass_threshold}%)")
     
-    # Display all questions and answers
+    # Breakdowns by topic and scenario (only when the bank has them)
+    for title, breakdown in [("Topic", score.by_topic), ("Scenario", score.by_scenario)]:
+        if not breakdown.empty:
+            st.write(f"### Results by {title}:")
+            table_html = breakdown.rename(columns={'Group': title}).to_html(
+                classes='results-table', index=False, float_format=lambda x: f"{x:.1f}%")
+            st.markdown(f'<div class="results-table-container">{table_html}</div>', unsafe_allow_html=True)
+    
+    # Detailed results are paged and filtered so only one page is rendered per rerun
     st.write("## Detailed Results:")
     
-    for result in results:
+    results_filter = st.radio(
+        "Show:",
+        list(RESULTS_FILTERS),
+        horizontal=True,
+        key="results_filter",
+        on_change=lambda: setattr(st.session_state, 'results_page', 0)
+    )
+    selected = np.flatnonzero(RESULTS_FILTERS[results_filter](score))
+    num_pages = max(1, -(-len(selected) // RESULTS_PER_PAGE))
+    page = min(st.session_state.results_page, num_pages - 1)
+    page_questions = selected[page * RESULTS_PER_PAGE:(page + 1) * RESULTS_PER_PAGE]
+    
+    if len(selected) == 0:
+        st.info("No questions match this filter.")
+    
+    previous_scenario_id = -1
+    for q_index in page_questions:
         with st.container():
-            # Display scenario if available
-            scenario_value = result['Scenario']
-            if scenario_value.strip() and scenario_value != 'nan':
-                scenario_paragraphs = [p.strip() for p in scenario_value.split('\n') if p.strip()]
-                
-                scenario_html = '''
-                <div class="scenario-container">
-                    <div class="scenario-header">📖 SCENARIO</div>
-                '''
-                
-                for paragraph in scenario_paragraphs:
-                    scenario_html += f'<div class="scenario-content">{paragraph}</div>'
-                
-                scenario_html += '</div>'
-                st.markdown(scenario_html, unsafe_allow_html=True)
+            # Show each scenario once at the start of its group on this page
+            scenario_id = bank.scenario_id[q_index]
+            if scenario_id >= 0 and scenario_id != previous_scenario_id:
+                st.markdown(fragments.scenario(q_index), unsafe_allow_html=True)
+            previous_scenario_id = scenario_id
             
-            st.write(f"### Question {result['Question Number']}")
+            st.write(f"### Question {q_index + 1}")
             st.write("**Question:**")
-            
-            # Display question with paragraphs in results
-            question_text = result['Question']
-            question_paragraphs = [p.strip() for p in question_text.split('\n') if p.strip()]
-            
-            question_html = '<div class="question-container">'
-            for paragraph in question_paragraphs:
-                question_html += f'<div class="question-paragraph">{paragraph}</div>'
-            question_html += '</div>'
-            
-            st.markdown(question_html, unsafe_allow_html=True)
+            st.markdown(fragments.question(q_index), unsafe_allow_html=True)
             
             # Color coding for answers
+            user_answer = get_answer_sheet().answer_text(bank, q_index, "Not answered")
+            correct_answer = bank.correct_answer(q_index)
             st.write("**Your Answer:**")
-            if result['Status'] == '✅ Correct':
-                st.success(f"{result['Your Answer']} ✅")
-                st.success(f"**Correct Answer:** {result['Correct Answer']}")
+            if score.correct[q_index]:
+                st.success(f"{user_answer} ✅")
+                st.success(f"**Correct Answer:** {correct_answer}")
             else:
-                st.error(f"{result['Your Answer']} ❌")
-                st.success(f"**Correct Answer:** {result['Correct Answer']}")
-            
-            # Show hint if available
-            if result['Status'] == '❌ Incorrect':
-                hint = questions_df.iloc[result['Question Number']-1].get('Hint')
-                if pd.notna(hint) and str(hint).strip():
+                st.error(f"{user_answer} ❌")
+                st.success(f"**Correct Answer:** {correct_answer}")
+                
+                # Show hint if available
+                hint = bank.hint(q_index)
+                if hint.strip():
                     st.info(f"💡 **Hint:** {hint}")
             
             st.write("---")
     
+    # Results paging
+    if num_pages > 1:
+        col_prev, col_page, col_next = st.columns([1, 2, 1])
+        with col_prev:
+            if st.button("⬅️ Previous results", disabled=page == 0):
+                st.session_state.results_page = page - 1
+                st.rerun()
+        with col_page:
+            st.write(f"Page {page + 1} of {num_pages} ({len(selected)} questions)")
+        with col_next:
+            if st.button("More results ➡️", disabled=page + 1 >= num_pages):
+                st.session_state.results_page = page + 1
+                st.rerun()
+    
     # Option to restart
     st.write("---")
     if st.button("Start New Quiz", type="primary"):
         st.session_state.current_q = 0
-        st.session_state.user_answers = {}
-        st.session_state.shuffled_options = {}
+        st.session_state.answer_sheet = None
         st.session_state.quiz_completed = False
         st.session_state.quiz_submitted = False
         st.session_state.exam_started = False
-        st.session_state.exam_start_time = None
+        st.session_state.exam_deadline = None
         st.session_state.time_up = False
         st.session_state.auto_submitted = False
+        st.session_state.results_page = 0
+        st.session_state.results_celebrated = False
         st.rerun()
+
+timer.done()
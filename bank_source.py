@@ -0,0 +1,495 @@
+"""Question bank data source shared by both quiz apps.
+
+The bank is downloaded from the Google Sheets CSV export. Instead of
+re-downloading the whole export every time a cache entry expires, the
+current snapshot is kept in process memory and revalidated with a
+conditional GET (ETag / Last-Modified) in a background thread, while
+sessions keep being served the snapshot they already have. A changed
+export is streamed: it is hashed, parsed and compiled a block at a time
+as it downloads, so a refresh never holds the raw export whole. A new
+version is only published when the content hash actually changes. An
+export served without ETag or Last-Modified (so every revalidation gets
+the full body) is hashed first and only parsed when the hash differs.
+
+Requests go through one pooled HTTP session shared by the process: the
+connection to the export host is kept alive between refreshes, the body
+is requested gzip-compressed, connect and read timeouts are separate,
+and idempotent GETs that fail to connect or get a 429/5xx are retried a
+bounded number of times with jittered exponential backoff.
+
+All fetches go through a process-wide single-flight gate, so a cache
+expiry or a burst of "Refresh Questions" clicks results in one request
+to the export URL no matter how many sessions are active.
+
+A circuit breaker sits in front of the source. While it is open, and
+whenever a fetch fails, sessions are served the in-memory snapshot or
+the last-known-good copy saved on disk instead of waiting on timeouts.
+
+Every new version of the export is compiled once into the binary format
+from question_bank.py and served from a memory map. On startup the
+compiled copy on disk is served straight away and revalidated in the
+background, so a cold process does not wait on a download or a CSV parse.
+"""
+import hashlib
+import io
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from typing import Optional
+
+import pyarrow as pa
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
+
+from question_bank import (QuestionBank, compile_batches, compile_source, open_bank, question_store,
+                           read_csv_batches, stamp_bank, write_bank)
+
+SHEET_URL = "https://docs.google.com/spreadsheets/d/1OhPzpNeKII4Fn1UQCQQvjFTjkiMtma-fPfY2eVIOi4c/edit?usp=sharing"
+# QUESTION_BANK_URL points the apps at another CSV export (e.g. the load test's stand-in)
+CSV_URL = os.environ.get('QUESTION_BANK_URL', SHEET_URL.replace('/edit?usp=sharing', '/export?format=csv'))
+
+# Seconds a snapshot is considered fresh before it is revalidated
+CACHE_TTL = 300
+# Seconds to establish a connection, and to wait for each read of the response
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+REQUEST_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+# Retries per request: connection failures and 429/5xx responses are retried
+# up to RETRY_TOTAL times, a read that timed out or broke off only once
+RETRY_TOTAL = 3
+RETRY_READ = 1
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Backoff before retry n (from 1) is drawn uniformly from [0, min(BACKOFF_MAX, BACKOFF_BASE * 2**(n-1))]
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 4.0
+# Hosts with a pool of kept-alive connections: the export URL redirects to
+# googleusercontent.com, so both hosts must stay pooled for keep-alive to work
+POOL_HOSTS = 4
+# Connections kept alive per host
+POOL_SIZE = 4
+# Bytes read from the response at a time while streaming the export in
+DOWNLOAD_CHUNK_SIZE = 1 << 16
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Last-known-good copy of the export, served while the source is down
+SNAPSHOT_PATH = os.path.join(APP_DIR, '.bank_cache', 'last_known_good.arrow')
+BUNDLED_WORKBOOK = os.path.join(APP_DIR, '2391-052_practice.xlsx')
+
+
+class HashingStream(io.RawIOBase):
+    """Readable stream over downloaded chunks that hashes the bytes as they are read.
+
+    Wrapped in io.BufferedReader it offers read() and peek(), which is all
+    the streaming CSV parser needs, and only the chunks not yet parsed are
+    held in memory.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = b''
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        # Fill the whole buffer when the source has that much, so a peek sees the full header
+        filled = 0
+        view = memoryview(buffer)
+        while filled < len(view):
+            if not self._pending:
+                self._pending = next(self._chunks, b'')
+                if not self._pending:
+                    break
+            n = min(len(self._pending), len(view) - filled)
+            view[filled:filled + n] = self._pending[:n]
+            self._sha256.update(self._pending[:n])
+            self._pending = self._pending[n:]
+            filled += n
+        self.size += filled
+        return filled
+
+    def hexdigest(self):
+        """SHA-256 of everything read so far (the whole body once parsing is done)"""
+        return self._sha256.hexdigest()
+
+
+def open_stream(chunks):
+    """A buffered, hashing reader over an iterable of byte chunks"""
+    return io.BufferedReader(HashingStream(chunks), buffer_size=DOWNLOAD_CHUNK_SIZE)
+
+
+class JitteredRetry(Retry):
+    """urllib3 Retry with "full jitter" backoff, so retrying processes do not stampede in step"""
+
+    def get_backoff_time(self):
+        consecutive_errors = len(list(itertools.takewhile(lambda h: h.redirect_location is None,
+                                                          reversed(self.history))))
+        if consecutive_errors == 0:
+            return 0
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (consecutive_errors - 1)))
+
+    def parse_retry_after(self, retry_after):
+        # Honour the server's Retry-After, but never hold a refresh for longer than BACKOFF_MAX
+        return min(super().parse_retry_after(retry_after), BACKOFF_MAX)
+
+
+def new_http_session():
+    """A pooled, keep-alive HTTP session for data-source access"""
+    retry = JitteredRetry(
+        total=RETRY_TOTAL,
+        read=RETRY_READ,
+        redirect=5,
+        status_forcelist=RETRY_STATUSES,
+        # Only idempotent requests are retried
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        respect_retry_after_header=True,
+        # Hand back the last error response so raise_for_status() reports it
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip'
+    return session
+
+
+http_session = new_http_session()
+
+
+class _Call:
+    """A fetch in progress that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[Exception] = None
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def _begin(self, key):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                return call, False
+            call = _Call()
+            self._calls[key] = call
+            self.executions += 1
+            return call, True
+
+    def _run(self, key, call, fn):
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def do(self, key, fn):
+        """Call fn, or wait for the identical call already in flight"""
+        call, leader = self._begin(key)
+        if leader:
+            self._run(key, call, fn)
+        else:
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do_async(self, key, fn):
+        """Start fn in a background thread unless a call for key is in flight"""
+        call, leader = self._begin(key)
+        if leader:
+            threading.Thread(target=self._run, args=(key, call, fn),
+                             name=f"single-flight-{key}", daemon=True).start()
+        return leader
+
+    def stats(self):
+        """Counters for monitoring how much work was saved"""
+        with self._lock:
+            return {
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls),
+            }
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of contacting a data source that is known to be down"""
+
+
+class CircuitBreaker:
+    """Stop calling a failing source and probe it again at a controlled rate.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    no requests are made for ``reset_timeout`` seconds. After that a single
+    probe is let through (half-open); success closes the circuit, failure
+    opens it for another ``reset_timeout``.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self._probing or time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def ready(self):
+        """Whether a request would currently be allowed (no side effects)"""
+        return self.state == 'closed' or (self.state == 'half-open' and not self._probing)
+
+    def allow(self):
+        """Claim permission for one request"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class BankSnapshot:
+    """A compiled version of the question bank plus its cache validators"""
+
+    def __init__(self, bank: QuestionBank, source='sheets'):
+        self.bank = question_store.publish(bank)
+        self.content_hash = bank.content_hash
+        self.etag = bank.etag
+        self.last_modified = bank.last_modified
+        self.source = source
+        self.fetched_at = time.monotonic()
+
+    @property
+    def version(self):
+        """Short version ID derived from the content hash"""
+        return self.bank.version
+
+
+class BankCache:
+    """Stale-while-revalidate cache for the question bank export"""
+
+    def __init__(self, url=CSV_URL, ttl=CACHE_TTL, parser=read_csv_batches, snapshot_path=SNAPSHOT_PATH,
+                 session=http_session):
+        self.url = url
+        self.session = session
+        self.ttl = ttl
+        self.parser = parser
+        self.snapshot_path = snapshot_path
+        self.snapshot: Optional[BankSnapshot] = None
+        self.last_error: Optional[Exception] = None
+        self.flight = SingleFlight()
+        self.breaker = CircuitBreaker()
+        self._startup_lock = threading.Lock()
+
+    def get(self):
+        """Return the current snapshot, fetching it first if there is none.
+
+        A stale snapshot is returned immediately and revalidated in the
+        background. Errors are only raised when neither the source nor the
+        last-known-good snapshot on disk can provide a bank.
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            snapshot = self._load_on_startup()
+        if snapshot is None:
+            return self.revalidate()
+        if time.monotonic() - snapshot.fetched_at >= self.ttl and self.breaker.ready():
+            self.flight.do_async(self._flight_key(snapshot), self._background_revalidate)
+        return snapshot
+
+    def revalidate(self):
+        """Revalidate now; joins the fetch already running for this version, if any"""
+        return self.flight.do(self._flight_key(self.snapshot), self._fetch)
+
+    @staticmethod
+    def _flight_key(snapshot):
+        # One fetch per bank version: callers holding the same snapshot coalesce
+        return snapshot.version if snapshot is not None else 'initial'
+
+    def _fetch(self):
+        if not self.breaker.allow():
+            return self._fall_back(CircuitOpenError("Question source unavailable, retrying shortly"))
+        try:
+            snapshot = self._fetch_from_source()
+        except Exception as e:
+            self.breaker.record_failure()
+            return self._fall_back(e)
+        self.breaker.record_success()
+        return snapshot
+
+    def _fetch_from_source(self):
+        current = self.snapshot
+        headers = {}
+        if current is not None and current.source == 'sheets':
+            if current.etag:
+                headers['If-None-Match'] = current.etag
+            if current.last_modified:
+                headers['If-Modified-Since'] = current.last_modified
+
+        try:
+            response = self.session.get(self.url, headers=headers, timeout=REQUEST_TIMEOUT, stream=True)
+        except requests.exceptions.ConnectionError as e:
+            # requests reports reads that still timed out after their retry as a
+            # connection error; surface them as the timeout they are
+            reason = getattr(e.args[0], 'reason', None) if e.args else None
+            if isinstance(reason, ReadTimeoutError):
+                raise requests.exceptions.ReadTimeout(e, request=e.request) from e
+            raise
+
+        # Reading the body to the end inside the with block returns the connection to the pool
+        with response:
+            if response.status_code == 304 and current is not None:
+                # Read the (empty) body so the connection goes back to the pool instead of being closed
+                response.content
+                current.source = 'sheets'
+                current.fetched_at = time.monotonic()
+                return current
+            response.raise_for_status()
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            # The hash is of the decoded CSV, so it does not depend on the encoding
+            stream = open_stream(response.iter_content(DOWNLOAD_CHUNK_SIZE))
+
+            if current is not None and etag is None and last_modified is None:
+                # Without validators every revalidation is a full 200, usually of
+                # the same bytes: spool the body to disk while hashing it, and
+                # only parse it once the hash shows it changed
+                with tempfile.TemporaryFile() as body:
+                    shutil.copyfileobj(stream, body, DOWNLOAD_CHUNK_SIZE)
+                    content_hash = stream.raw.hexdigest()
+                    if content_hash == current.content_hash:
+                        return self._unchanged(current, etag, last_modified)
+                    body.seek(0)
+                    table = compile_batches(self.parser(body))
+            else:
+                # The body is decompressed, parsed and compiled while it downloads,
+                # a block at a time; it is never held whole, as bytes or as text
+                table = compile_batches(self.parser(stream))
+                content_hash = stream.raw.hexdigest()
+
+        if current is not None and current.content_hash == content_hash:
+            return self._unchanged(current, etag, last_modified)
+        if table.num_rows == 0:
+            # A cleared sheet is upstream breakage, not a new bank: fail like a
+            # bad export so the last-known-good copy is kept, not overwritten
+            raise ValueError("The question source returned no questions")
+
+        table = stamp_bank(table, content_hash, etag, last_modified)
+        snapshot = BankSnapshot(self._store_compiled(table))
+        self.snapshot = snapshot
+        self.last_error = None
+        return snapshot
+
+    @staticmethod
+    def _unchanged(current, etag, last_modified):
+        """Same bytes as before: keep the current bank, just refresh its validators"""
+        current.etag = etag
+        current.last_modified = last_modified
+        current.source = 'sheets'
+        current.fetched_at = time.monotonic()
+        return current
+
+    def _fall_back(self, error):
+        """Serve the in-memory or on-disk last-known-good bank after a failure"""
+        self.last_error = error
+        snapshot = self.snapshot or self._load_last_known_good()
+        if snapshot is None:
+            raise error
+        snapshot.source = 'snapshot'
+        self.snapshot = snapshot
+        return snapshot
+
+    def _store_compiled(self, table):
+        """Persist a compiled bank as the last-known-good copy and map it back in"""
+        try:
+            write_bank(table, self.snapshot_path)
+            return open_bank(self.snapshot_path)
+        except OSError:
+            # Read-only or full disk: serve the compiled table from memory
+            return QuestionBank(table)
+
+    def _load_last_known_good(self):
+        if os.path.exists(self.snapshot_path):
+            try:
+                return BankSnapshot(open_bank(self.snapshot_path))
+            except (OSError, ValueError, pa.ArrowException):
+                pass
+        if os.path.exists(BUNDLED_WORKBOOK):
+            # No usable snapshot yet: seed from the workbook shipped with the app
+            table = compile_source(BUNDLED_WORKBOOK)
+            return BankSnapshot(self._store_compiled(table))
+        return None
+
+    def _load_on_startup(self):
+        """Serve the compiled bank from disk at once and revalidate it in the background"""
+        with self._startup_lock:
+            if self.snapshot is None and os.path.exists(self.snapshot_path):
+                try:
+                    snapshot = BankSnapshot(open_bank(self.snapshot_path))
+                except (OSError, ValueError, pa.ArrowException):
+                    return None
+                snapshot.fetched_at = float('-inf')
+                self.snapshot = snapshot
+        return self.snapshot
+
+    def _background_revalidate(self):
+        try:
+            return self._fetch()
+        except Exception as e:
+            self.last_error = e
+            return self.snapshot
+
+    def refresh(self):
+        """Revalidate now, falling back to the current snapshot on failure"""
+        try:
+            return self.revalidate()
+        except Exception as e:
+            self.last_error = e
+            return self.snapshot
+
+
+# Process-wide cache shared by every session of both apps
+bank_cache = BankCache()
@@ -0,0 +1,299 @@
+"""Exam clocks that tick in the browser.
+
+The time shown to the user is counted down (or up) by a small script in
+the page, so the display stays live without the server rerunning the
+app once a second. The server only keeps the authoritative start time
+and deadline of each attempt in ExamDeadline and checks every answer and
+submission against it; whatever the browser shows, late answers are
+rejected.
+
+Sessions that never come back (closed or idle tabs) are closed at their
+deadline by a single DeadlineScheduler thread. It keeps every pending
+deadline in a min-heap and sleeps until the earliest one, so thousands
+of running exams cost one thread and no polling. Results graded that way
+are appended to RESULTS_LOG, since their session may never show them.
+"""
+import heapq
+import html
+import itertools
+import json
+import os
+import threading
+import time
+
+# Allowance for network and rerun latency on answers sent just before the deadline
+SUBMIT_GRACE = 2
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# One JSON line per attempt graded at its deadline by the scheduler
+RESULTS_LOG = os.path.join(APP_DIR, '.progress', 'exam_results.jsonl')
+_results_lock = threading.Lock()
+
+TIMER_STYLE = """
+<style>
+    body { margin: 0; font-family: "Source Sans Pro", sans-serif; }
+    .timer-container {
+        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+        border-radius: 10px;
+        padding: 15px;
+        margin: 10px 0;
+        color: white;
+        text-align: center;
+        font-weight: bold;
+        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+    }
+    .timer-warning {
+        background: linear-gradient(135deg, #ff6b6b 0%, #ee5a24 100%);
+    }
+    .timer-critical {
+        background: linear-gradient(135deg, #ff0000 0%, #8b0000 100%);
+    }
+    .timer {
+        font-size: 1.1em;
+        font-weight: bold;
+        color: #2196F3;
+        padding: 8px 12px;
+        border-radius: 4px;
+        background-color: rgba(33, 150, 243, 0.1);
+        display: inline-block;
+    }
+</style>
+"""
+
+
+class _Scheduled:
+    """A callback waiting in the scheduler heap"""
+
+    __slots__ = ('when', 'callback', 'args', 'cancelled')
+
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+
+class DeadlineScheduler:
+    """Run callbacks at wall-clock deadlines from one background thread.
+
+    Pending entries live in a min-heap ordered by deadline. The thread
+    waits on a condition until the earliest deadline and is only woken
+    early when a new entry becomes the earliest. Cancelled entries are
+    skipped when popped, and the heap is rebuilt once they make up more
+    than half of it.
+    """
+
+    def __init__(self, name="exam-deadlines"):
+        self.name = name
+        self._heap = []
+        self._counter = itertools.count()
+        self._cancelled = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self.fired = 0
+        self.errors = 0
+
+    def schedule(self, when, callback, *args):
+        """Call ``callback(*args)`` at ``when`` (a time.time() value)"""
+        entry = _Scheduled(when, callback, args)
+        with self._cond:
+            heapq.heappush(self._heap, (when, next(self._counter), entry))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            if self._heap[0][2] is entry:
+                self._cond.notify()
+        return entry
+
+    def cancel(self, entry):
+        with self._cond:
+            if entry.cancelled:
+                return
+            entry.cancelled = True
+            self._cancelled += 1
+            if self._cancelled > len(self._heap) // 2:
+                self._heap = [item for item in self._heap if not item[2].cancelled]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+
+    def _next_due(self):
+        with self._cond:
+            while True:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                when, _, entry = self._heap[0]
+                if entry.cancelled:
+                    heapq.heappop(self._heap)
+                    self._cancelled -= 1
+                    continue
+                delay = when - time.time()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                # Marked so a late cancel() does not count it as a heap leftover
+                entry.cancelled = True
+                return entry
+
+    def _run(self):
+        while True:
+            entry = self._next_due()
+            try:
+                entry.callback(*entry.args)
+                self.fired += 1
+            except Exception:
+                self.errors += 1
+
+    def stats(self):
+        """Counters for monitoring the scheduler"""
+        with self._cond:
+            return {
+                'pending': len(self._heap) - self._cancelled,
+                'fired': self.fired,
+                'errors': self.errors,
+            }
+
+
+# One scheduler thread for every exam in the process
+deadline_scheduler = DeadlineScheduler()
+
+
+class ExamDeadline:
+    """Server-side start time and deadline of one timed attempt.
+
+    Answers are recorded through ``record`` and the attempt is closed
+    with ``close``; both hold the same lock, so the scheduler freezing
+    an exam cannot interleave with an answer arriving at the last moment.
+    """
+
+    def __init__(self, duration, started_at=None):
+        self.duration = duration
+        self.started_at = time.time() if started_at is None else started_at
+        self.deadline = self.started_at + duration
+        self.closed = False
+        self.final_report = None
+        # Graded when the attempt closes; the session replaces it whenever it rebases its answers
+        self.sheet = None
+        self._lock = threading.Lock()
+        self._scheduled = None
+        self._scheduler = None
+
+    def elapsed(self, now=None):
+        now = time.time() if now is None else now
+        return min(max(now - self.started_at, 0), self.duration)
+
+    def remaining(self, now=None):
+        now = time.time() if now is None else now
+        return max(self.deadline - now, 0)
+
+    def expired(self, now=None):
+        return self.remaining(now) <= 0
+
+    def accepts(self, now=None):
+        """Whether an answer or submission arriving now still counts"""
+        now = time.time() if now is None else now
+        return not self.closed and now <= self.deadline + SUBMIT_GRACE
+
+    def record(self, fn, *args):
+        """Call ``fn(*args)`` if the attempt still accepts answers; returns whether it did"""
+        with self._lock:
+            if not self.accepts():
+                return False
+            fn(*args)
+            return True
+
+    def close(self, grade=None):
+        """Freeze the attempt; ``grade()`` is called once to keep its final result"""
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            if grade is not None:
+                self.final_report = grade()
+        if self._scheduled is not None:
+            self._scheduler.cancel(self._scheduled)
+
+    def close_at_deadline(self, grade, scheduler=deadline_scheduler):
+        """Have the scheduler close and grade the attempt if the session never does"""
+        self._scheduler = scheduler
+        self._scheduled = scheduler.schedule(self.deadline + SUBMIT_GRACE, self.close, grade)
+
+
+def log_result(result, path=RESULTS_LOG):
+    """Append one attempt's result (a JSON-serialisable dict) to the results log"""
+    line = json.dumps(result, sort_keys=True) + '\n'
+    with _results_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as f:
+            f.write(line)
+
+
+def format_hms(seconds):
+    """Format seconds as HH:MM:SS"""
+    seconds = max(int(seconds), 0)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def _timer_class(remaining, warn_at, critical_at):
+    timer_class = "timer-container"
+    if remaining < warn_at:
+        timer_class += " timer-warning"
+    if remaining < critical_at:
+        timer_class += " timer-critical"
+    return timer_class
+
+
+def countdown_html(remaining, title="⏰ EXAM TIME REMAINING", note="", warn_at=1800, critical_at=600):
+    """Self-contained countdown from ``remaining`` seconds.
+
+    The script counts against the browser's monotonic clock from the
+    moment the page is rendered, so clock differences between server and
+    browser do not matter. The server renders the initial value itself,
+    so the display is right even before the script runs.
+    """
+    return f"""{TIMER_STYLE}
+<div id="timer" class="{_timer_class(remaining, warn_at, critical_at)}">
+    <div style="font-size: 1.1em;">{html.escape(title)}</div>
+    <div id="clock" style="font-size: 1.8em; margin: 10px 0;">{format_hms(remaining)}</div>
+    <div id="note" style="font-size: 0.9em;">{html.escape(note)}</div>
+</div>
+<script>
+    const end = performance.now() + {int(remaining * 1000)};
+    const pad = (n) => String(n).padStart(2, "0");
+    function tick() {{
+        const left = Math.max(0, end - performance.now());
+        const s = Math.ceil(left / 1000);
+        document.getElementById("clock").textContent =
+            pad(Math.floor(s / 3600)) + ":" + pad(Math.floor(s % 3600 / 60)) + ":" + pad(s % 60);
+        const timer = document.getElementById("timer");
+        timer.classList.toggle("timer-warning", s < {warn_at});
+        timer.classList.toggle("timer-critical", s < {critical_at});
+        if (left > 0) {{
+            setTimeout(tick, left % 1000 || 1000);
+        }} else {{
+            document.getElementById("note").textContent = "Time's up! Answers are no longer accepted.";
+        }}
+    }}
+    tick();
+</script>
+"""
+
+
+def stopwatch_html(elapsed):
+    """Self-contained timer counting up from ``elapsed`` seconds"""
+    return f"""{TIMER_STYLE}
+<div class="timer">⏱️ <span id="clock">{format_hms(elapsed)}</span></div>
+<script>
+    const start = performance.now() - {int(elapsed * 1000)};
+    const pad = (n) => String(n).padStart(2, "0");
+    function tick() {{
+        const passed = performance.now() - start;
+        const s = Math.floor(passed / 1000);
+        document.getElementById("clock").textContent =
+            pad(Math.floor(s / 3600)) + ":" + pad(Math.floor(s % 3600 / 60)) + ":" + pad(s % 60);
+        setTimeout(tick, 1000 - passed % 1000);
+    }}
+    tick();
+</script>
+"""
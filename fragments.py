@@ -0,0 +1,66 @@
+"""Pre-rendered HTML fragments for questions and scenarios.
+
+Scenario and question blocks are rendered (and HTML-escaped) the first
+time a question is shown and then kept for the lifetime of the bank
+version, shared by every session. Rendering a page is reduced to
+looking strings up by question index.
+"""
+import html
+
+SCENARIO_HEADER = '<div class="scenario-header">📖 SCENARIO</div>'
+
+
+def _paragraphs(paragraphs, css_class):
+    return ''.join(f'<div class="{css_class}">{html.escape(p)}</div>' for p in paragraphs)
+
+
+class BankFragments:
+    """Lazily rendered HTML for one bank version, indexed by question"""
+
+    def __init__(self, bank):
+        self.bank = bank
+        self._questions = {}
+        self._scenarios = {}
+        self._scenario_progress = {}
+        self._feedback = {}
+
+    def question(self, i):
+        """The question text in a question-container block"""
+        fragment = self._questions.get(i)
+        if fragment is None:
+            body = _paragraphs(self.bank.question_paragraphs(i), 'question-paragraph')
+            fragment = self._questions[i] = f'<div class="question-container">{body}</div>'
+        return fragment
+
+    def scenario(self, i, with_progress=False):
+        """The scenario block for question i ('' when it has no scenario)"""
+        scenario_id = int(self.bank.scenario_id[i])
+        if scenario_id < 0:
+            return ''
+        body = self._scenarios.get(scenario_id)
+        if body is None:
+            body = self._scenarios[scenario_id] = _paragraphs(self.bank.scenario_paragraphs(i), 'scenario-content')
+        if not with_progress:
+            return f'<div class="scenario-container">{SCENARIO_HEADER}{body}</div>'
+
+        fragment = self._scenario_progress.get(i)
+        if fragment is None:
+            progress = (f'<div class="scenario-progress">Scenario Question {self.bank.scenario_position[i]} '
+                        f'of {self.bank.scenario_size[i]}</div>')
+            fragment = self._scenario_progress[i] = (
+                f'<div class="scenario-container">{SCENARIO_HEADER}{body}{progress}</div>')
+        return fragment
+
+    def incorrect_feedback(self, i):
+        """Feedback line naming the correct answer"""
+        fragment = self._feedback.get(i)
+        if fragment is None:
+            answer = html.escape(self.bank.correct_answer(i))
+            fragment = self._feedback[i] = (
+                f'<div class="incorrect-answer">❌ Incorrect. The correct answer is: {answer}</div>')
+        return fragment
+
+
+def fragments_for(bank):
+    """The shared fragment cache for a bank version"""
+    return bank.derived('fragments', BankFragments)
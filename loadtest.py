@@ -0,0 +1,530 @@
+"""Concurrent-session load test for both quiz apps.
+
+Each app is started in a real Streamlit server (a throwaway copy of the
+app directory, so caches and saved progress start empty) and driven by
+N concurrent headless sessions over the same websocket protocol the
+browser uses. Every session runs a realistic flow - load, answer,
+navigate, submit and view results - including fragment reruns, which
+AppTest cannot drive. The question bank comes from a local stand-in for
+the Google Sheets CSV export, so runs are repeatable and offline.
+
+Reported per app: p50/p95/p99 rerun latency (request sent to script
+finished, as seen by the client), server CPU time per session and
+server RSS growth per session. CPU and RSS are read from /proc, so they
+are only reported on Linux.
+
+    python loadtest.py --sessions 20                    # run and print the report
+    python loadtest.py --sessions 20 --save-baseline    # store the results as the baseline
+    python loadtest.py --sessions 20 --check            # exit 1 on regressions against it
+
+Needs the ``websockets`` package, which ships with recent Streamlit
+releases (pip install websockets on older ones).
+"""
+import argparse
+import asyncio
+import glob
+import gzip
+import hashlib
+import http.server
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APPS = ['2391-052_practice.py', 'one_pager.py']
+BASELINE_PATH = os.path.join(APP_DIR, 'loadtest_baseline.json')
+
+# Allowed growth over the baseline before a metric counts as a regression:
+# relative, plus an absolute slack so tiny numbers do not flap
+DEFAULT_TOLERANCE = 0.25
+SLACK = {
+    'p50_ms': 5.0,
+    'p95_ms': 10.0,
+    'p99_ms': 20.0,
+    'cpu_ms_per_session': 20.0,
+    'rss_kb_per_session': 512.0,
+}
+SERVER_START_TIMEOUT = 60
+RERUN_TIMEOUT = 60
+
+
+def make_bank_csv(num_questions, seed=0):
+    """A synthetic bank in the export's format: scenario groups, hints and topics"""
+    rng = random.Random(seed)
+    lines = ['Question,OptionA,OptionB,OptionC,OptionD,CorrectAnswer,Scenario,Hint,Topic']
+    for i in range(num_questions):
+        options = [f"Option {letter} for question {i}" for letter in 'ABCD']
+        scenario = f'"Scenario {i // 5}\nThe installation is a {i // 5 + 1}-way TP&N board."' if i % 10 < 5 else ''
+        lines.append(f'"Question {i}: which value applies?\nSecond paragraph of question {i}.",'
+                     f'{",".join(options)},{rng.choice(options)},{scenario},Hint {i},Topic {i % 7}')
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class SheetStandIn:
+    """Local HTTP server standing in for the Google Sheets CSV export.
+
+    Like the real export it honours ETags, keeps connections alive and
+    gzips the body for clients that accept it. It counts requests,
+    connections and body bytes sent, so fetch costs can be measured.
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self.gzipped = gzip.compress(content)
+        self.etag = '"%s"' % hashlib.sha256(content).hexdigest()[:16]
+        self.requests = 0
+        self.connections = 0
+        self.bytes_sent = 0
+        stand_in = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; do not let Nagle hold the body back
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                stand_in.connections += 1
+
+            def do_GET(self):
+                stand_in.requests += 1
+                if self.headers.get('If-None-Match') == stand_in.etag:
+                    self.send_response(304)
+                    self.send_header('ETag', stand_in.etag)
+                    self.end_headers()
+                    return
+                body = stand_in.content
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/csv; charset=utf-8')
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = stand_in.gzipped
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', stand_in.etag)
+                self.end_headers()
+                self.wfile.write(body)
+                stand_in.bytes_sent += len(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/export?format=csv"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, name="sheet-stand-in", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class ProcessStats:
+    """CPU time and RSS of a process from /proc (None where unavailable)"""
+
+    def __init__(self, pid):
+        self.pid = pid
+
+    def cpu_seconds(self):
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            return None
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+    def rss_bytes(self):
+        try:
+            with open(f"/proc/{self.pid}/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except OSError:
+            return None
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class AppServer:
+    """One app running in a Streamlit server on a copy of the app directory"""
+
+    def __init__(self, script, bank_url):
+        self.script = script
+        self.bank_url = bank_url
+        self.port = _free_port()
+        self.proc = None
+        self._workdir = None
+
+    def __enter__(self):
+        self._workdir = tempfile.TemporaryDirectory(prefix='quiz-loadtest-')
+        for path in glob.glob(os.path.join(APP_DIR, '*.py')) + glob.glob(os.path.join(APP_DIR, '*.xlsx')):
+            shutil.copy(path, self._workdir.name)
+        if os.path.isdir(os.path.join(APP_DIR, '.streamlit')):
+            shutil.copytree(os.path.join(APP_DIR, '.streamlit'), os.path.join(self._workdir.name, '.streamlit'))
+        env = dict(os.environ, QUESTION_BANK_URL=self.bank_url)
+        # Server output goes to a file: an undrained pipe would stall the server once full
+        self._log = open(os.path.join(self._workdir.name, 'server.log'), 'w+b')
+        self.proc = subprocess.Popen(
+            [sys.executable, '-m', 'streamlit', 'run', self.script,
+             '--server.headless=true', f'--server.port={self.port}', '--server.address=127.0.0.1',
+             '--server.enableXsrfProtection=false', '--server.fileWatcherType=none',
+             '--browser.gatherUsageStats=false'],
+            cwd=self._workdir.name, env=env, stdout=self._log, stderr=subprocess.STDOUT)
+        self._wait_until_healthy()
+        self.stats = ProcessStats(self.proc.pid)
+        return self
+
+    def _wait_until_healthy(self):
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                self._log.seek(0)
+                raise RuntimeError(f"{self.script} server exited: {self._log.read().decode()[-2000:]}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{self.port}/_stcore/health", timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError(f"{self.script} server did not start within {SERVER_START_TIMEOUT}s")
+
+    @property
+    def ws_url(self):
+        return f"ws://127.0.0.1:{self.port}/_stcore/stream"
+
+    def __exit__(self, *exc):
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self._log.close()
+        self._workdir.cleanup()
+
+
+class Session:
+    """A headless browser tab: sends reruns with widget state, tracks widgets from the deltas"""
+
+    def __init__(self, ws, think_time=0.0, rng=None):
+        # Imported here so the module can be read (and --help shown) without Streamlit's protos loaded
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        self._BackMsg, self._ForwardMsg, self._WidgetState = BackMsg, ForwardMsg, WidgetState
+        self.ws = ws
+        self.think_time = think_time
+        self.rng = rng or random.Random()
+        self.widgets = {}    # widget id -> (element type, element proto)
+        self.fragments = {}  # widget id -> id of the fragment that rendered it
+        self.states = {}     # widget id -> WidgetState sent with every rerun
+        self.latencies = []
+        self.errors = []
+
+    async def rerun(self, trigger=None, fragment_id=''):
+        """Send one rerun and wait for the script to finish; returns its latency in seconds"""
+        if self.think_time:
+            await asyncio.sleep(self.rng.uniform(0, 2 * self.think_time))
+        msg = self._BackMsg()
+        request = msg.rerun_script
+        request.query_string = ''
+        request.page_script_hash = ''
+        request.fragment_id = fragment_id
+        request.widget_states.widgets.extend(self.states.values())
+        if trigger is not None:
+            request.widget_states.widgets.append(self._WidgetState(id=trigger, trigger_value=True))
+        if not fragment_id:
+            self.widgets.clear()
+        started = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        await asyncio.wait_for(self._until_finished(), RERUN_TIMEOUT)
+        latency = time.perf_counter() - started
+        self.latencies.append(latency)
+        return latency
+
+    async def _until_finished(self):
+        while True:
+            fm = self._ForwardMsg()
+            fm.ParseFromString(await self.ws.recv())
+            kind = fm.WhichOneof('type')
+            if kind == 'delta' and fm.delta.WhichOneof('type') == 'new_element':
+                element = fm.delta.new_element
+                element_type = element.WhichOneof('type')
+                inner = getattr(element, element_type)
+                if element_type == 'exception':
+                    self.errors.append(f"{inner.type}: {inner.message}")
+                widget_id = getattr(inner, 'id', '')
+                if widget_id:
+                    self.widgets[widget_id] = (element_type, inner)
+                    self.fragments[widget_id] = fm.delta.fragment_id
+            elif kind == 'script_finished' and fm.script_finished != self._ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                return
+
+    def find(self, label=None, key=None):
+        """Widget id and proto by label or by user key (ids end with '-<key>')"""
+        for widget_id, (_, inner) in self.widgets.items():
+            if key is not None and widget_id.endswith(f"-{key}"):
+                return widget_id, inner
+            if label is not None and getattr(inner, 'label', None) == label:
+                return widget_id, inner
+        return None, None
+
+    async def click(self, label=None, key=None):
+        """Click an enabled button; returns whether it was there to click"""
+        widget_id, button = self.find(label, key)
+        if widget_id is None or button.disabled:
+            return False
+        await self.rerun(trigger=widget_id, fragment_id=self.fragments[widget_id])
+        return True
+
+    async def choose(self, option, label=None, key=None):
+        """Select a radio option by position; returns whether the radio was there"""
+        widget_id, radio = self.find(label, key)
+        if widget_id is None or radio.disabled or not radio.options:
+            return False
+        value = radio.options[option % len(radio.options)]
+        self.states[widget_id] = self._WidgetState(id=widget_id, string_value=value)
+        await self.rerun(fragment_id=self.fragments[widget_id])
+        return True
+
+
+async def practice_flow(session, answers):
+    """Timed exam: start, answer and move on question by question, submit, browse results"""
+    await session.rerun()
+    await session.click(label="🚀 Start Exam Timer")
+    for q in range(answers):
+        if not await session.choose(q, key=f"q{q}"):
+            break
+        if not await session.click(label="Next"):
+            break
+    await session.click(label="Submit Quiz")
+    await session.choose(1, label="Show:")
+    await session.click(label="More results ➡️")
+
+
+async def one_pager_flow(session, answers):
+    """Study mode: answer down the page, check some answers, page on, save and export"""
+    await session.rerun()
+    for q in range(answers):
+        if session.find(key=f"q_{q}")[0] is None and not await session.click(label="Next ➡️"):
+            break
+        if not await session.choose(q, key=f"q_{q}"):
+            break
+        if q % 3 == 0:
+            await session.click(key=f"check_{q}")
+    await session.click(label="💾 Save Progress")
+    await session.click(label="📊 Export Results to CSV")
+
+
+FLOWS = {
+    '2391-052_practice.py': practice_flow,
+    'one_pager.py': one_pager_flow,
+}
+
+
+class _Barrier:
+    """Lets sessions that finished their flow wait, still connected, for the rest"""
+
+    def __init__(self, parties):
+        self.parties = parties
+        self.arrived = 0
+        self._all = asyncio.Event()
+
+    def arrive(self):
+        self.arrived += 1
+        if self.arrived >= self.parties:
+            self._all.set()
+
+    async def wait(self):
+        await self._all.wait()
+
+
+async def _run_session(url, flow, answers, think_time, seed, barrier):
+    arrived = False
+    try:
+        async with websockets.connect(url, subprotocols=['streamlit'], max_size=None) as ws:
+            session = Session(ws, think_time, random.Random(seed))
+            try:
+                await flow(session, answers)
+            except Exception as e:
+                session.errors.append(f"{type(e).__name__}: {e}")
+            # Stay connected until every session has finished, so RSS is measured with all of them live
+            arrived = True
+            barrier.arrive()
+            await barrier.wait()
+            return session
+    finally:
+        if not arrived:
+            barrier.arrive()
+
+
+async def _sample_rss(stats, peak, stop):
+    while not stop.is_set():
+        rss = stats.rss_bytes()
+        if rss is not None:
+            peak[0] = max(peak[0], rss)
+        try:
+            await asyncio.wait_for(stop.wait(), 0.1)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _drive(server, sessions, answers, think_time, ramp):
+    flow = FLOWS[server.script]
+    # Warm-up session: loads the bank and imports everything before measuring
+    await _run_session(server.ws_url, flow, answers, 0, -1, _Barrier(1))
+    base_rss = server.stats.rss_bytes()
+    base_cpu = server.stats.cpu_seconds()
+    peak, stop = [base_rss or 0], asyncio.Event()
+    sampler = asyncio.ensure_future(_sample_rss(server.stats, peak, stop))
+
+    barrier = _Barrier(sessions)
+
+    async def delayed(n):
+        await asyncio.sleep(ramp * n / sessions)
+        return await _run_session(server.ws_url, flow, answers, think_time, n, barrier)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(delayed(n) for n in range(sessions)), return_exceptions=True)
+    wall = time.perf_counter() - started
+    stop.set()
+    await sampler
+    cpu = server.stats.cpu_seconds()
+    return results, wall, base_rss, peak[0], base_cpu, cpu
+
+
+def run_app(script, bank_url, sessions, answers, think_time, ramp):
+    """Run one app under load and summarise the measurements"""
+    with AppServer(script, bank_url) as server:
+        results, wall, base_rss, peak_rss, base_cpu, cpu = asyncio.run(
+            _drive(server, sessions, answers, think_time, ramp))
+
+    errors = [str(r) for r in results if isinstance(r, BaseException)]
+    completed = [r for r in results if not isinstance(r, BaseException)]
+    for session in completed:
+        errors.extend(session.errors)
+    latencies = np.array([latency for session in completed for latency in session.latencies]) * 1000
+    summary = {
+        'sessions': sessions,
+        'reruns': int(latencies.size),
+        'wall_s': round(wall, 2),
+        'errors': len(errors),
+    }
+    if latencies.size:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        summary.update(p50_ms=round(p50, 1), p95_ms=round(p95, 1), p99_ms=round(p99, 1))
+    if base_cpu is not None and cpu is not None:
+        summary['cpu_ms_per_session'] = round(1000 * (cpu - base_cpu) / sessions, 1)
+    if base_rss is not None:
+        summary['rss_kb_per_session'] = round(max(peak_rss - base_rss, 0) / 1024 / sessions, 1)
+    return summary, errors
+
+
+def compare(results, baseline, tolerance):
+    """Regressions as (app, metric, baseline, current) for metrics worse than allowed"""
+    regressions = []
+    for script, current in results.items():
+        previous = baseline.get('apps', {}).get(script)
+        if previous is None:
+            continue
+        for metric, slack in SLACK.items():
+            if metric in current and metric in previous:
+                if current[metric] > previous[metric] * (1 + tolerance) + slack:
+                    regressions.append((script, metric, previous[metric], current[metric]))
+    return regressions
+
+
+def _print_report(results, config):
+    print(f"\n{config['sessions']} concurrent sessions, {config['answers']} answers each, "
+          f"{config['questions']}-question bank, think time {config['think_time']}s")
+    columns = ['reruns', 'p50_ms', 'p95_ms', 'p99_ms', 'cpu_ms_per_session', 'rss_kb_per_session', 'errors']
+    print(f"{'app':<24}" + ''.join(f"{c:>20}" for c in columns))
+    for script, summary in results.items():
+        print(f"{script:<24}" + ''.join(f"{summary.get(c, '-'):>20}" for c in columns))
+    if 'source_requests' in config:
+        print(f"Question source: {config['source_requests']} requests over {config['source_connections']} "
+              f"connections, {config['source_bytes'] / 1024:.1f} KB sent")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the quiz apps")
+    parser.add_argument('--sessions', type=int, default=10, help="concurrent sessions per app")
+    parser.add_argument('--answers', type=int, default=12, help="questions each session answers")
+    parser.add_argument('--questions', type=int, default=120, help="size of the synthetic bank")
+    parser.add_argument('--think-time', type=float, default=0.1, help="mean pause between actions (s)")
+    parser.add_argument('--ramp', type=float, default=2.0, help="seconds over which sessions connect")
+    parser.add_argument('--app', action='append', choices=APPS, help="app to test (default: both)")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline file")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the baseline")
+    parser.add_argument('--check', action='store_true', help="exit 1 on regressions against the baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative growth per metric")
+    args = parser.parse_args(argv)
+
+    if websockets is None:
+        sys.exit("loadtest.py needs the websockets package: pip install websockets")
+
+    config = {
+        'sessions': args.sessions,
+        'answers': args.answers,
+        'questions': args.questions,
+        'think_time': args.think_time,
+    }
+    results = {}
+    failed = False
+    with SheetStandIn(make_bank_csv(args.questions)) as sheet:
+        for script in args.app or APPS:
+            summary, errors = run_app(script, sheet.url, args.sessions, args.answers, args.think_time, args.ramp)
+            results[script] = summary
+            for error in errors[:5]:
+                print(f"{script}: {error}", file=sys.stderr)
+            failed = failed or bool(errors)
+        config['source_requests'] = sheet.requests
+        config['source_connections'] = sheet.connections
+        config['source_bytes'] = sheet.bytes_sent
+    _print_report(results, config)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'config': config, 'apps': results}, f, indent=2)
+            f.write('\n')
+        print(f"\nBaseline saved to {args.baseline}")
+
+    if args.check:
+        if not os.path.exists(args.baseline):
+            sys.exit(f"No baseline at {args.baseline}; run with --save-baseline first")
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        stored = {k: v for k, v in baseline.get('config', {}).items() if not k.startswith('source_')}
+        current = {k: v for k, v in config.items() if not k.startswith('source_')}
+        if stored != current:
+            print(f"\nWarning: baseline was recorded with {stored}, this run used {current}", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        for script, metric, previous, value in regressions:
+            print(f"REGRESSION {script} {metric}: {previous} -> {value}", file=sys.stderr)
+        failed = failed or bool(regressions)
+        if not regressions:
+            print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
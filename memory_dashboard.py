@@ -0,0 +1,242 @@
+"""Admin-only memory dashboard for capacity planning.
+
+Either app serves it instead of the quiz when opened with
+``?admin=<token>`` and the QUIZ_ADMIN_TOKEN environment variable set to
+the same token. Without that variable the dashboard is disabled.
+
+It shows, for the process it runs in:
+
+- the approximate deep size of every session-state key, per session and
+  summed over all live sessions, so it is clear which key dominates
+- the footprint of the shared question banks and their per-bank caches
+- the counters of the shared services (bank fetches run and coalesced,
+  exam deadlines, progress writes)
+- tracemalloc's top allocating lines, on demand (tracing slows the
+  process down, so it is only on between Start and Stop)
+
+Deep sizes follow references from each value but stop at process-wide
+shared objects (the question banks, caches, scheduler and stores), so
+a session is only charged for what it holds on its own. Sizes are
+approximate: they come from sys.getsizeof plus the buffer sizes numpy,
+pandas and pyarrow report.
+"""
+import hmac
+import os
+import sys
+import tracemalloc
+import types
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+from rerun_metrics import service_stats
+
+ADMIN_TOKEN = os.environ.get('QUIZ_ADMIN_TOKEN')
+# Allocation sites shown per tracemalloc snapshot
+TOP_ALLOCATORS = 25
+
+# Followed for their size but not into: code and module objects are shared by everyone
+_OPAQUE = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+           types.MethodType, types.CodeType)
+
+
+def admin_requested():
+    """Whether this request carries the admin token"""
+    if not ADMIN_TOKEN:
+        return False
+    token = st.query_params.get('admin')
+    # Compared as bytes: compare_digest rejects str with non-ASCII characters
+    return token is not None and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def shared_objects():
+    """Process-wide objects that sessions reference but do not own"""
+    from bank_source import bank_cache
+    from exam_timer import deadline_scheduler
+    from progress_store import progress_store
+    from question_bank import question_store
+    from rerun_metrics import registry
+
+    return [bank_cache, deadline_scheduler, progress_store, question_store, registry, *question_store.banks()]
+
+
+def deep_size(obj, seen=None, shared=()):
+    """Approximate bytes reachable from ``obj``, not counting ``seen`` or ``shared`` object ids"""
+    seen = set() if seen is None else seen
+    shared_ids = {id(o) for o in shared}
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        obj_id = id(obj)
+        if obj_id in seen or obj_id in shared_ids:
+            continue
+        seen.add(obj_id)
+        if isinstance(obj, np.ndarray):
+            # getsizeof includes the buffer of an array that owns its data; a view
+            # only reports its header, its owner is counted where it is held
+            total += sys.getsizeof(obj)
+        elif isinstance(obj, (pd.DataFrame, pd.Series)):
+            total += int(np.sum(obj.memory_usage(deep=True)))
+        elif isinstance(obj, (pa.Table, pa.Array, pa.ChunkedArray)):
+            total += obj.nbytes
+        elif isinstance(obj, (str, bytes, bytearray, int, float, complex, bool)) or obj is None:
+            total += sys.getsizeof(obj)
+        elif isinstance(obj, _OPAQUE):
+            total += sys.getsizeof(obj)
+        elif isinstance(obj, dict):
+            total += sys.getsizeof(obj)
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            total += sys.getsizeof(obj)
+            stack.extend(obj)
+        else:
+            total += sys.getsizeof(obj)
+            if hasattr(obj, '__dict__'):
+                stack.append(vars(obj))
+            for cls in type(obj).__mro__:
+                for name in getattr(cls, '__slots__', ()):
+                    if hasattr(obj, name):
+                        stack.append(getattr(obj, name))
+    return total
+
+
+def session_states():
+    """(session id, user-visible session state) of every live session in this process.
+
+    Uses Streamlit's runtime internals, so it returns an empty list rather
+    than failing if a Streamlit release changes them.
+    """
+    try:
+        from streamlit.runtime import get_instance
+        sessions = get_instance()._session_mgr.list_active_sessions()
+    except (AttributeError, RuntimeError, ImportError):
+        return []
+    states = []
+    for info in sessions:
+        try:
+            states.append((info.session.id, dict(info.session.session_state.filtered_state)))
+        except (AttributeError, KeyError, RuntimeError):
+            # Session shutting down, or its state changing under us: skip it this time
+            continue
+    return states
+
+
+def session_sizes(states, shared):
+    """Deep size of every key of every session, as a DataFrame (session, key, bytes)"""
+    rows = []
+    for session_id, state in states:
+        # Objects shared between keys of one session are charged to the first key only
+        seen = set()
+        for key in sorted(state):
+            rows.append((session_id[:8], key, deep_size(state[key], seen, shared)))
+    return pd.DataFrame(rows, columns=['session', 'key', 'bytes'])
+
+
+def bank_footprint():
+    """Size of each kept question bank and its caches, as a DataFrame"""
+    from question_bank import question_store
+
+    rows = []
+    for bank in question_store.banks():
+        caches = bank.caches()
+        row = {'version': bank.version, 'questions': len(bank), 'arrow table': bank.table.nbytes}
+        seen = {id(bank)}
+        for name, value in caches.items():
+            row[name] = deep_size(value, seen)
+        row['total'] = sum(v for k, v in row.items() if k not in ('version', 'questions'))
+        rows.append(row)
+    return pd.DataFrame(rows).fillna(0)
+
+
+def process_rss():
+    """Resident set size of this process in bytes (None where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return None
+
+
+def _mb(size):
+    return size / (1024 * 1024)
+
+
+def _tracemalloc_panel():
+    st.subheader("Top allocators (tracemalloc)")
+    if not tracemalloc.is_tracing():
+        st.caption("Tracing is off. It slows every allocation down while on, so stop it when done.")
+        if st.button("Start tracing"):
+            tracemalloc.start()
+            st.rerun()
+        return
+
+    current, peak = tracemalloc.get_traced_memory()
+    st.caption(f"Tracing: {_mb(current):.1f} MB traced now, {_mb(peak):.1f} MB peak since start")
+    col1, col2 = st.columns(2)
+    with col1:
+        take = st.button("Take snapshot", type="primary")
+    with col2:
+        if st.button("Stop tracing"):
+            tracemalloc.stop()
+            st.rerun()
+    if take:
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ])
+        stats = snapshot.statistics('lineno')[:TOP_ALLOCATORS]
+        st.dataframe(pd.DataFrame({
+            'location': [f"{s.traceback[0].filename}:{s.traceback[0].lineno}" for s in stats],
+            'size (KB)': [round(s.size / 1024, 1) for s in stats],
+            'blocks': [s.count for s in stats],
+        }), hide_index=True, use_container_width=True)
+
+
+def render_memory_dashboard():
+    """The dashboard page (call only after admin_requested())"""
+    st.title("Memory dashboard")
+    if st.button("🔄 Refresh"):
+        st.rerun()
+
+    states = session_states()
+    sizes = session_sizes(states, shared_objects())
+    rss = process_rss()
+    banks = bank_footprint()
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Process RSS", f"{_mb(rss):.1f} MB" if rss is not None else "n/a")
+    col2.metric("Live sessions", len(states))
+    col3.metric("Session state (all sessions)", f"{_mb(sizes['bytes'].sum()):.2f} MB")
+
+    st.subheader("Session state by key")
+    if sizes.empty:
+        st.info("No session state to report (or the Streamlit runtime could not be inspected).")
+    else:
+        by_key = sizes.groupby('key')['bytes'].agg(['count', 'sum', 'mean', 'max']).sort_values('sum', ascending=False)
+        by_key.columns = ['sessions', 'total bytes', 'mean bytes', 'max bytes']
+        st.dataframe(by_key.round(0), use_container_width=True)
+
+        st.subheader("Sessions")
+        per_session = sizes.pivot_table(index='session', columns='key', values='bytes', aggfunc='sum', fill_value=0)
+        per_session = per_session[by_key.index]
+        per_session.insert(0, 'total bytes', per_session.sum(axis=1))
+        st.dataframe(per_session.sort_values('total bytes', ascending=False), use_container_width=True)
+
+    st.subheader("Question banks (shared by all sessions)")
+    if banks.empty:
+        st.info("No question bank loaded in this process yet.")
+    else:
+        st.dataframe(banks, hide_index=True, use_container_width=True)
+
+    st.subheader("Shared services")
+    stats = service_stats()
+    st.dataframe(pd.DataFrame([(service, key, value) for service, counters in stats.items()
+                               for key, value in counters.items()],
+                              columns=['service', 'counter', 'value']),
+                 hide_index=True, use_container_width=True)
+
+    _tracemalloc_panel()
@@ -1,13 +1,27 @@
 import streamlit as st
 import pandas as pd
-import random
-import requests
-import io
+import numpy as np
 import time
 import datetime
 import json
+import sqlite3
+import uuid
+import streamlit.components.v1 as components
 from typing import Dict, List, Optional
 
+from bank_source import bank_cache
+from exam_timer import stopwatch_html
+from question_bank import question_store
+from fragments import fragments_for
+from memory_dashboard import admin_requested, render_memory_dashboard
+from progress_store import Progress, progress_store
+from rerun_metrics import rerun_timer
+from scoring import AnswerSheet
+
+# Phase timings of this rerun (a no-op unless metrics are enabled, see rerun_metrics.py)
+timer = rerun_timer('one_pager')
+timer.phase('css')
+
 # Security headers and configuration
 st.set_page_config(
     page_title="Electrical Installations Quiz",
@@ -16,6 +30,11 @@ st.set_page_config(
     initial_sidebar_state="expanded"  # Changed to expanded for navigation
 )
 
+# Admin-only memory dashboard (?admin=<QUIZ_ADMIN_TOKEN>), served instead of the quiz
+if admin_requested():
+    render_memory_dashboard()
+    st.stop()
+
 # Add dark mode compatible CSS with additional styles
 st.markdown("""
 <style>
@@ -132,17 +151,6 @@ st.markdown("""
     .stApp {
         color: var(--text-color);
     }
-    
-    /* Timer styling */
-    .timer {
-        font-size: 1.1em;
-        font-weight: bold;
-        color: #2196F3;
-        padding: 8px 12px;
-        border-radius: 4px;
-        background-color: rgba(33, 150, 243, 0.1);
-        display: inline-block;
-    }
 </style>
 """, unsafe_allow_html=True)
 
@@ -154,53 +162,57 @@ def initialize_session_state():
     """Initialize all session state variables"""
     if 'initialized' not in st.session_state:
         st.session_state.initialized = True
-        st.session_state.user_answers = {}
-        st.session_state.answer_checked = {}
-        st.session_state.shuffled_options = {}
+        # Answers, option order and checked flags as compact arrays (scoring.AnswerSheet)
+        st.session_state.answer_sheet = None
         st.session_state.questions_loaded = False
-        st.session_state.questions_df = pd.DataFrame()
-        st.session_state.scenario_groups = {}
+        st.session_state.bank_version = None  # ID of the shared bank in question_store
         st.session_state.current_page = 0
         st.session_state.quiz_mode = "study"  # "study" or "test"
         st.session_state.start_time = None
+        st.session_state.finish_time = None  # Server time the timed quiz was finished
         st.session_state.quiz_finished = False
-        st.session_state.progress_data = load_saved_progress()
+        st.session_state.progress_data = None
+        st.session_state.progress_key = None  # (user, bank version) progress_data was saved for
+
+def get_user_id():
+    """Stable learner ID, kept in the URL (?uid=) so a reload or bookmark resumes the same progress"""
+    if 'user_id' not in st.session_state:
+        user_id = st.query_params.get('uid')
+        if not user_id:
+            user_id = uuid.uuid4().hex
+            st.query_params['uid'] = user_id
+        st.session_state.user_id = user_id
+    return st.session_state.user_id
+
+def get_bank():
+    """Return the shared question bank this session is working on"""
+    return question_store.get(st.session_state.get('bank_version'))
+
+def get_answer_sheet():
+    """Return this session's answer sheet, starting a new one after a reset or bank change"""
+    bank = get_bank()
+    sheet = st.session_state.answer_sheet
+    if sheet is None or not sheet.tracks(bank):
+        sheet = st.session_state.answer_sheet = AnswerSheet(bank)
+    return sheet
 
 # Data validation functions
-def validate_question_data(df):
-    """Validate the structure and content of questions"""
-    if df.empty:
+def validate_question_data(bank):
+    """Report problems in the question bank (checked once per bank version)"""
+    if len(bank) == 0:
         st.error("No questions data found!")
         return False
     
-    # Check required columns
-    required_columns = ['Question', 'OptionA', 'OptionB', 'OptionC', 'OptionD', 'CorrectAnswer']
-    missing_columns = [col for col in required_columns if col not in df.columns]
-    
-    if missing_columns:
-        st.error(f"Missing required columns: {missing_columns}")
-        return False
+    report = bank.validation
     
-    # Check for empty questions
-    empty_questions = df['Question'].isna() | (df['Question'].str.strip() == '')
-    if empty_questions.any():
-        st.warning(f"Found {empty_questions.sum()} empty questions")
+    empty_questions = report.count('empty_question')
+    if empty_questions:
+        st.warning(f"Found {empty_questions} empty questions")
     
-    # Validate correct answers exist in options
-    validation_errors = []
-    for idx, row in df.iterrows():
-        correct_answer = str(row['CorrectAnswer'])
-        options = [str(row[f'Option{chr(65+i)}']) for i in range(4)]
-        options = [opt for opt in options if opt and opt != 'nan' and opt.strip() != '']
-        
-        if correct_answer not in options and correct_answer != '':
-            validation_errors.append(f"Question {idx+1}: Correct answer '{correct_answer}' not found in options")
-    
-    if validation_errors:
-        for error in validation_errors[:5]:  # Show first 5 errors
-            st.error(error)
-        if len(validation_errors) > 5:
-            st.error(f"... and {len(validation_errors) - 5} more errors")
+    if not report.ok:
+        st.error(f"Found {len(report.errors)} errors in the question data")
+        with st.expander("Show all validation issues"):
+            st.dataframe(report.issues, hide_index=True, use_container_width=True)
         return False
     
     return True
@@ -208,72 +220,90 @@ def validate_question_data(df):
 # Progress tracking functions
 def calculate_score():
     """Calculate detailed score breakdown"""
-    if not st.session_state.answer_checked:
+    sheet = get_answer_sheet()
+    if sheet.checked_count == 0:
         return None
     
-    correct = 0
-    total_checked = len([k for k, v in st.session_state.answer_checked.items() if v])
-    
-    for i, checked in st.session_state.answer_checked.items():
-        if checked and i in st.session_state.user_answers:
-            row = st.session_state.questions_df.iloc[i]
-            if st.session_state.user_answers[i] == str(row['CorrectAnswer']):
-                correct += 1
+    # Memoized per answer state, so repeated calls in one rerun cost nothing
+    bank = get_bank()
+    score = sheet.report(bank, checked_only=True)
     
     return {
-        'correct': correct,
-        'total_checked': total_checked,
-        'accuracy': (correct / total_checked * 100) if total_checked > 0 else 0,
-        'total_questions': len(st.session_state.questions_df)
+        'correct': score.correct_count,
+        'total_checked': score.total,
+        'accuracy': score.percentage,
+        'total_questions': len(bank)
     }
 
 def save_progress():
-    """Save user progress to session state and simulate local storage"""
-    progress = {
-        'timestamp': datetime.datetime.now().isoformat(),
-        'answers': st.session_state.user_answers.copy(),
-        'checked': st.session_state.answer_checked.copy(),
-        'score': calculate_score(),
-        'quiz_mode': st.session_state.quiz_mode,
-        'current_page': st.session_state.current_page
-    }
+    """Save user progress to session state and the persistent progress store"""
+    # A copy of the sheet's compact arrays; the write itself happens in the background
+    sheet = get_answer_sheet()
+    progress = Progress(sheet.codes.copy(), sheet.checked,
+                        st.session_state.quiz_mode, st.session_state.current_page, seed=sheet.seed)
     st.session_state.progress_data = progress
+    st.session_state.progress_key = (get_user_id(), st.session_state.bank_version)
+    
+    try:
+        progress_store.save(get_user_id(), st.session_state.bank_version, progress)
+    except (sqlite3.Error, OSError) as e:
+        st.warning(f"Progress could not be saved: {e}")
     return progress
 
-def load_saved_progress():
-    """Load saved progress from session state"""
-    # In a real app, you might load from file/database
-    # For now, we'll use session state
-    return getattr(st.session_state, 'progress_data', None)
+def autosave_answer(question):
+    """Journal one changed answer; the write happens in the background, debounced"""
+    key = (get_user_id(), st.session_state.bank_version)
+    if st.session_state.progress_data is None or st.session_state.progress_key != key:
+        # The journal is replayed on top of a snapshot, so the first save per bank version is a full one
+        save_progress()
+        return
+    sheet = get_answer_sheet()
+    try:
+        progress_store.append(*key, question, int(sheet.codes[question]), size=len(sheet))
+    except (sqlite3.Error, OSError) as e:
+        st.warning(f"Progress could not be saved: {e}")
+
+def load_saved_progress(bank):
+    """Restore this user's saved progress for the bank, if there is any"""
+    try:
+        saved = progress_store.load(get_user_id(), bank.version, size=len(bank))
+    except (sqlite3.Error, OSError) as e:
+        st.warning(f"Saved progress could not be loaded: {e}")
+        return False
+    if saved is None or len(saved.answers) != len(bank):
+        return False
+    
+    st.session_state.answer_sheet = AnswerSheet(bank, saved.answers, saved.checked, saved.seed)
+    st.session_state.current_page = saved.current_page
+    return True
 
 def export_results():
     """Export quiz results to CSV"""
-    results = []
-    for i in range(len(st.session_state.questions_df)):
-        row = st.session_state.questions_df.iloc[i]
-        user_answer = st.session_state.user_answers.get(i, 'Not answered')
-        correct_answer = str(row['CorrectAnswer'])
-        is_correct = user_answer == correct_answer if user_answer != 'Not answered' else False
-        
-        results.append({
-            'Question_Number': i + 1,
-            'Question': row['Question'],
-            'User_Answer': user_answer,
-            'Correct_Answer': correct_answer,
-            'Is_Correct': is_correct,
-            'Was_Checked': st.session_state.answer_checked.get(i, False),
-            'Scenario': row.get('Scenario', '')
-        })
+    bank = get_bank()
+    sheet = get_answer_sheet()
+    score = sheet.report(bank)
     
-    return pd.DataFrame(results)
+    return pd.DataFrame({
+        'Question_Number': np.arange(1, len(bank) + 1),
+        'Question': bank.frame['Question'],
+        'User_Answer': [sheet.answer_text(bank, q, 'Not answered') for q in range(len(bank))],
+        'Correct_Answer': bank.frame['CorrectAnswer'],
+        'Is_Correct': score.correct,
+        'Was_Checked': sheet.checked,
+        'Scenario': bank.frame['Scenario']
+    })
 
 # Navigation functions
 def get_current_page_questions():
     """Get questions for current page"""
     start_idx = st.session_state.current_page * QUESTIONS_PER_PAGE
-    end_idx = min(start_idx + QUESTIONS_PER_PAGE, len(st.session_state.questions_df))
+    end_idx = min(start_idx + QUESTIONS_PER_PAGE, len(get_bank()))
     return list(range(start_idx, end_idx))
 
+def change_page(step):
+    """Page change callback (runs before the rerun, so no second rerun is needed)"""
+    st.session_state.current_page += step
+
 def scroll_to_question(question_id):
     """Simulate scroll to question (Streamlit doesn't support direct scroll)"""
     st.session_state.current_page = question_id // QUESTIONS_PER_PAGE
@@ -285,46 +315,33 @@ def format_time(seconds):
     return str(datetime.timedelta(seconds=int(seconds)))
 
 def update_timer():
-    """Update and display timer"""
-    if st.session_state.start_time and not st.session_state.quiz_finished:
-        elapsed = time.time() - st.session_state.start_time
-        return elapsed
-    return 0
-
-# Load questions function
-@st.cache_data(ttl=300)
+    """Elapsed quiz time by the server clock (frozen once the quiz is finished)"""
+    if not st.session_state.start_time:
+        return 0
+    end_time = st.session_state.finish_time if st.session_state.quiz_finished else time.time()
+    return end_time - st.session_state.start_time
+
+# Load questions function (shared process-wide, revalidated in the background)
 def load_questions_data():
-    SHEET_URL = "https://docs.google.com/spreadsheets/d/1OhPzpNeKII4Fn1UQCQQvjFTjkiMtma-fPfY2eVIOi4c/edit?usp=sharing"
-    
     try:
-        csv_url = SHEET_URL.replace('/edit?usp=sharing', '/export?format=csv')
-        response = requests.get(csv_url, timeout=10)
-        response.raise_for_status()
-        
-        questions_df = pd.read_csv(io.StringIO(response.content.decode('utf-8')))
-        questions_df = questions_df.fillna('')
-        
-        return questions_df
+        snapshot = bank_cache.get()
+        if snapshot.source == 'snapshot':
+            st.warning("Google Sheets is unavailable - showing the last saved copy of the questions.")
+        return snapshot.bank
     
     except Exception as e:
         st.error(f"Error loading questions: {e}")
-        return pd.DataFrame()
-
-# Build scenario groups
-def build_scenario_groups(df):
-    scenario_groups = {}
-    for idx, row in df.iterrows():
-        scenario = str(row.get('Scenario', '')).strip()
-        if scenario and scenario != 'nan' and scenario != '':
-            if scenario not in scenario_groups:
-                scenario_groups[scenario] = []
-            scenario_groups[scenario].append(idx)
-    return scenario_groups
+        return None
 
 # Initialize session state
+timer.phase('session_state')
 initialize_session_state()
 
+# Sessions only hold the version ID; the bank itself is shared process-wide
+bank = get_bank()
+
 # Sidebar for navigation and controls
+timer.phase('sidebar')
 with st.sidebar:
     st.header("⚡ Quiz Controls")
     
@@ -343,25 +360,32 @@ with st.sidebar:
         if not st.session_state.start_time and not st.session_state.quiz_finished:
             if st.button("🚀 Start Timed Quiz", type="primary"):
                 st.session_state.start_time = time.time()
+                st.session_state.finish_time = None
                 st.session_state.quiz_finished = False
-                st.session_state.user_answers = {}
-                st.session_state.answer_checked = {}
+                st.session_state.answer_sheet = None
+                if bank is not None:
+                    save_progress()
                 st.rerun()
         
         if st.session_state.start_time:
             elapsed = update_timer()
-            st.markdown(f'<div class="timer">⏱️ {format_time(elapsed)}</div>', unsafe_allow_html=True)
+            if st.session_state.quiz_finished:
+                st.markdown(f"⏱️ Finished in **{format_time(elapsed)}**")
+            else:
+                # Ticks in the browser instead of rerunning the app every second
+                components.html(stopwatch_html(elapsed), height=50)
             
-            if st.button("⏹️ Finish Quiz", type="secondary"):
+            if st.button("⏹️ Finish Quiz", type="secondary", disabled=st.session_state.quiz_finished):
                 st.session_state.quiz_finished = True
+                st.session_state.finish_time = time.time()
                 save_progress()
                 st.rerun()
     
     st.header("🧭 Navigation")
     
     # Quick jump to questions
-    if st.session_state.questions_loaded:
-        question_numbers = list(range(1, len(st.session_state.questions_df) + 1))
+    if bank is not None:
+        question_numbers = list(range(1, len(bank) + 1))
         selected_q = st.selectbox("Jump to question:", question_numbers)
         
         if st.button("Go to Question"):
@@ -369,9 +393,9 @@ with st.sidebar:
     
     # Progress overview
     st.header("📊 Progress")
-    if st.session_state.questions_loaded:
-        total_questions = len(st.session_state.questions_df)
-        checked_count = len([k for k, v in st.session_state.answer_checked.items() if v])
+    if bank is not None:
+        total_questions = len(bank)
+        checked_count = get_answer_sheet().checked_count
         
         if total_questions > 0:
             progress = checked_count / total_questions
@@ -384,7 +408,7 @@ with st.sidebar:
                 st.write(f"**Accuracy:** {score['accuracy']:.1f}%")
     
     # Export results
-    if st.session_state.questions_loaded and any(st.session_state.answer_checked.values()):
+    if bank is not None and get_answer_sheet().checked_count > 0:
         st.header("💾 Export")
         if st.button("📊 Export Results to CSV"):
             results_df = export_results()
@@ -399,19 +423,18 @@ with st.sidebar:
             )
 
 # Main content area
+timer.phase('load')
 col1, col2 = st.columns([3, 1])
 with col1:
     st.title("Electrical Installations Quiz")
     st.subheader("Practice Mode" if st.session_state.quiz_mode == "study" else "Timed Test Mode")
 with col2:
     if st.button("🔄 Refresh Questions", type="secondary"):
-        st.cache_data.clear()
+        bank_cache.refresh()
         st.session_state.questions_loaded = False
-        st.session_state.questions_df = pd.DataFrame()
-        st.session_state.scenario_groups = {}
-        st.session_state.user_answers = {}
-        st.session_state.answer_checked = {}
-        st.session_state.shuffled_options = {}
+        st.session_state.bank_version = None
+        st.session_state.answer_sheet = None
+        st.session_state.progress_data = None
         st.session_state.current_page = 0
         st.rerun()
 
@@ -420,20 +443,17 @@ if not st.session_state.questions_loaded:
     loading_placeholder = st.empty()
     loading_placeholder.info("🔄 Loading questions...")
 
-# Load questions
-if not st.session_state.questions_loaded or st.session_state.questions_df.empty:
-    questions_df = load_questions_data()
+# Load questions (again if the session's version was evicted from the store)
+if not st.session_state.questions_loaded or bank is None:
+    bank = load_questions_data()
     
-    if not questions_df.empty and validate_question_data(questions_df):
-        st.session_state.questions_df = questions_df
+    if bank is not None and validate_question_data(bank):
+        st.session_state.bank_version = bank.version
         st.session_state.questions_loaded = True
-        st.session_state.scenario_groups = build_scenario_groups(questions_df)
         
-        # Load saved progress if available
-        if st.session_state.progress_data:
-            st.session_state.user_answers = st.session_state.progress_data.get('answers', {})
-            st.session_state.answer_checked = st.session_state.progress_data.get('checked', {})
-            st.session_state.current_page = st.session_state.progress_data.get('current_page', 0)
+        # Resume saved progress if available (one primary-key read)
+        if get_answer_sheet().answered_count == 0 and load_saved_progress(bank):
+            st.toast("Resumed your saved progress")
         
         if 'loading_placeholder' in locals():
             loading_placeholder.empty()
@@ -441,9 +461,7 @@ if not st.session_state.questions_loaded or st.session_state.questions_df.empty:
         st.error("No valid questions could be loaded. Please check your data source.")
         st.stop()
 
-# Use the questions from session state
-questions_df = st.session_state.questions_df
-num_questions = len(questions_df)
+num_questions = len(bank)
 
 # Show question count and pagination info
 st.caption(f"Total Questions: {num_questions} | Page {st.session_state.current_page + 1}/{(num_questions // QUESTIONS_PER_PAGE) + 1}")
@@ -452,25 +470,25 @@ st.caption(f"Total Questions: {num_questions} | Page {st.session_state.current_p
 if num_questions > QUESTIONS_PER_PAGE:
     col1, col2, col3, col4 = st.columns([1, 1, 2, 1])
     with col1:
-        if st.button("⬅️ Previous", disabled=st.session_state.current_page == 0):
-            st.session_state.current_page -= 1
-            st.rerun()
+        st.button("⬅️ Previous", disabled=st.session_state.current_page == 0,
+                  on_click=change_page, args=(-1,))
     with col2:
-        if st.button("Next ➡️", disabled=(st.session_state.current_page + 1) * QUESTIONS_PER_PAGE >= num_questions):
-            st.session_state.current_page += 1
-            st.rerun()
+        st.button("Next ➡️", disabled=(st.session_state.current_page + 1) * QUESTIONS_PER_PAGE >= num_questions,
+                  on_click=change_page, args=(1,))
     with col4:
         if st.button("💾 Save Progress", type="secondary"):
             progress = save_progress()
             st.success("Progress saved successfully!")
 
 # Display questions for current page
+timer.phase('questions')
 current_questions = get_current_page_questions()
+fragments = fragments_for(bank)
 
-for i in current_questions:
-    row = questions_df.iloc[i]
-    global_index = i
-    
+# Each question card is a fragment: choosing an option reruns only that card
+@st.fragment
+def question_card(global_index):
+    card_timer = rerun_timer('one_pager', 'question_card')
     # Create a container for each question
     with st.container():
         st.write("---")
@@ -479,103 +497,84 @@ for i in current_questions:
         col_head1, col_head2 = st.columns([3, 1])
         with col_head1:
             st.subheader(f"Question {global_index + 1}")
+        sheet = get_answer_sheet()
+        is_correct = sheet.answer(global_index) == bank.correct_index[global_index]
         with col_head2:
-            if st.session_state.answer_checked.get(global_index, False):
-                user_answer = st.session_state.user_answers.get(global_index, "")
-                correct_answer = str(row['CorrectAnswer'])
-                if user_answer == correct_answer:
+            if sheet.is_checked(global_index):
+                if is_correct:
                     st.markdown("✅ **Answered Correctly**")
                 else:
                     st.markdown("❌ **Needs Review**")
-            elif global_index in st.session_state.user_answers:
+            elif sheet.is_answered(global_index):
                 st.markdown("📝 **Answer Saved**")
             else:
                 st.markdown("⏳ **Not Answered**")
         
-        # Display Scenario (if available)
-        current_scenario = str(row.get('Scenario', '')).strip()
-        if current_scenario and current_scenario != 'nan' and current_scenario != '':
-            scenario_paragraphs = [p.strip() for p in current_scenario.split('\n') if p.strip()]
-            
-            scenario_html = '''
-            <div class="scenario-container">
-                <div class="scenario-header">📖 SCENARIO</div>
-            '''
-            
-            for paragraph in scenario_paragraphs:
-                scenario_html += f'<div class="scenario-content">{paragraph}</div>'
-            scenario_html += '</div>'
-            
-            st.markdown(scenario_html, unsafe_allow_html=True)
+        # Display Scenario (if available) - pre-rendered once per bank version
+        if bank.scenario_id[global_index] >= 0:
+            st.markdown(fragments.scenario(global_index), unsafe_allow_html=True)
         
         # Display the question
         st.write("**Question:**")
-        question_text = str(row['Question'])
-        question_paragraphs = [p.strip() for p in question_text.split('\n') if p.strip()]
-        
-        question_html = '<div class="question-container">'
-        for paragraph in question_paragraphs:
-            question_html += f'<div class="question-paragraph">{paragraph}</div>'
-        question_html += '</div>'
+        st.markdown(fragments.question(global_index), unsafe_allow_html=True)
         
-        st.markdown(question_html, unsafe_allow_html=True)
-        
-        # Shuffle options only once per question (except in test mode)
-        if global_index not in st.session_state.shuffled_options:
-            options = [str(row['OptionA']), str(row['OptionB']), str(row['OptionC']), str(row['OptionD'])]
-            options = [opt for opt in options if opt and opt != 'nan' and opt.strip() != '']
-            
-            # Don't shuffle in test mode to maintain consistency
-            if st.session_state.quiz_mode == "test":
-                st.session_state.shuffled_options[global_index] = options
-            else:
-                st.session_state.shuffled_options[global_index] = random.sample(options, len(options))
+        # Shuffle options in an order derived from the attempt seed, so it is the same on every
+        # render (except in test mode, to maintain consistency); the text stays in the shared bank
+        options = bank.options(global_index)
+        option_order = sheet.option_order(bank, global_index, shuffle=st.session_state.quiz_mode != "test")
         
-        shuffled_options = st.session_state.shuffled_options[global_index]
+        # A finished timed quiz is closed to new answers (checked on the server too)
+        answers_locked = st.session_state.quiz_mode == "test" and st.session_state.quiz_finished
         
         # Display radio button for answer selection
         answer_key = f"q_{global_index}"
+        previous_answer = sheet.answer(global_index)
         user_answer = st.radio(
             "Choose your answer:",
-            shuffled_options,
+            option_order,
             key=answer_key,
-            index=shuffled_options.index(st.session_state.user_answers[global_index]) if global_index in st.session_state.user_answers else None
+            index=option_order.index(previous_answer) if previous_answer is not None else None,
+            format_func=options.__getitem__,
+            disabled=answers_locked
         )
         
-        # Store the selected answer
-        if user_answer:
-            st.session_state.user_answers[global_index] = user_answer
+        # Store the selected answer (only when it changed - every card rerun returns it)
+        if user_answer is not None and not answers_locked and user_answer != previous_answer:
+            sheet.set_code(global_index, user_answer)
             # Auto-save progress in test mode
             if st.session_state.quiz_mode == "test":
-                save_progress()
+                autosave_answer(global_index)
         
         # Check Answer button (disabled in test mode until quiz is finished)
         col1, col2 = st.columns([1, 4])
         with col1:
-            check_disabled = (global_index not in st.session_state.user_answers or 
+            check_disabled = (not sheet.is_answered(global_index) or 
                             (st.session_state.quiz_mode == "test" and not st.session_state.quiz_finished))
             
             if st.button("Check Answer", key=f"check_{global_index}", disabled=check_disabled, type="primary"):
-                st.session_state.answer_checked[global_index] = True
+                sheet.set_checked(global_index)
                 save_progress()
+                # Score and progress outside this card depend on checked answers
                 st.rerun()
         
         # Show result if answer was checked
-        if st.session_state.answer_checked.get(global_index, False):
-            correct_answer = str(row['CorrectAnswer'])
-            user_answer = st.session_state.user_answers.get(global_index, "")
-            
-            if user_answer == correct_answer:
+        if sheet.is_checked(global_index):
+            if sheet.answer(global_index) == bank.correct_index[global_index]:
                 st.markdown(f'<div class="correct-answer">✅ Correct! Well done.</div>', unsafe_allow_html=True)
             else:
-                st.markdown(f'<div class="incorrect-answer">❌ Incorrect. The correct answer is: {correct_answer}</div>', unsafe_allow_html=True)
+                st.markdown(fragments.incorrect_feedback(global_index), unsafe_allow_html=True)
                 
                 # Show hint if available
-                hint = row.get('Hint')
-                if pd.notna(hint) and str(hint).strip():
+                hint = bank.hint(global_index)
+                if hint.strip():
                     st.info(f"💡 **Hint:** {hint}")
+    card_timer.done()
+
+for i in current_questions:
+    question_card(i)
 
 # Final summary and quiz completion
+timer.phase('summary')
 st.write("---")
 st.subheader("Quiz Summary")
 
@@ -601,13 +600,15 @@ else:
 
 # Reset button
 if st.button("🔄 Reset All Answers", type="secondary"):
-    st.session_state.user_answers = {}
-    st.session_state.answer_checked = {}
-    st.session_state.shuffled_options = {}
+    st.session_state.answer_sheet = None
     st.session_state.quiz_finished = False
     st.session_state.start_time = None
+    st.session_state.finish_time = None
+    save_progress()
     st.rerun()
 
 # Footer
 st.markdown("---")
 st.caption("⚡ Electrical Installations Quiz | Practice and master your skills")
+
+timer.done()
@@ -0,0 +1,402 @@
+"""Persistent quiz progress, keyed by user and bank version.
+
+Progress is stored compactly: the answers are the int8 option indices
+the scoring engine already keeps (see scoring.py) and the checked flags
+are a bit-packed bitmap, so a saved attempt costs about one byte per
+question. The attempt's shuffle seed is saved with it, so a resumed
+attempt shows every question's options in the same order without the
+orders themselves being stored. Resuming is a single primary-key lookup.
+
+Stores share one small interface, so the backend can be swapped:
+
+    save(user_id, bank_version, progress)                 queue a full snapshot (returns at once)
+    append(user_id, bank_version, question, code, size)   journal one answer change (O(1))
+    load(user_id, bank_version, size)                     latest Progress or None
+    flush()                                               block until queued writes are durable
+
+SQLiteProgressStore runs the database in WAL mode, so reads never wait
+on the writer. All sessions of the process hand their writes to one
+writer thread. While it commits, newer writes pile up and go into the
+next transaction together (group commit), with only the latest state
+kept per key. Pending writes are served to load(), so a session always
+reads its own writes.
+
+Autosave goes through append(): each answer change is a small delta
+(question, option, time) added to the session's journal in memory.
+Journals are written behind, debounced: once a session has been quiet
+for AUTOSAVE_DEBOUNCE seconds, or at most AUTOSAVE_MAX_DELAY after its
+first unsaved change. Once a session has COMPACT_AFTER journal rows on
+disk, they are folded into its snapshot. A journal written before any
+snapshot is folded into an empty attempt of the bank's ``size`` as soon
+as it is written; until then, loading replays it on top of that empty
+attempt. Otherwise loading replays the journal on top of the snapshot.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from scoring import UNANSWERED
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+PROGRESS_DB = os.path.join(APP_DIR, '.progress', 'progress.sqlite3')
+
+# Read connections kept open for concurrent loads
+READ_POOL_SIZE = 4
+
+# Seconds of quiet before a session's journal is written, and the longest it may wait
+AUTOSAVE_DEBOUNCE = 1.0
+AUTOSAVE_MAX_DELAY = 5.0
+# Journal rows per session that trigger folding them into the snapshot
+COMPACT_AFTER = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress (
+    user_id      TEXT    NOT NULL,
+    bank_version TEXT    NOT NULL,
+    updated_at   REAL    NOT NULL,
+    quiz_mode    TEXT    NOT NULL,
+    current_page INTEGER NOT NULL,
+    answers      BLOB    NOT NULL,
+    checked      BLOB    NOT NULL,
+    seed         INTEGER,
+    PRIMARY KEY (user_id, bank_version)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS progress_journal (
+    user_id      TEXT    NOT NULL,
+    bank_version TEXT    NOT NULL,
+    question     INTEGER NOT NULL,
+    option       INTEGER NOT NULL,
+    at           REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS progress_journal_key ON progress_journal (user_id, bank_version);
+"""
+# Columns added after the first release, for databases created before them
+MIGRATIONS = {
+    'seed': "ALTER TABLE progress ADD COLUMN seed INTEGER",
+}
+
+# Statements are kept as constants so every call reuses the connection's
+# compiled statement cache instead of preparing the SQL again
+UPSERT_SQL = """
+INSERT INTO progress (user_id, bank_version, updated_at, quiz_mode, current_page, answers, checked, seed)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (user_id, bank_version) DO UPDATE SET
+    updated_at = excluded.updated_at,
+    quiz_mode = excluded.quiz_mode,
+    current_page = excluded.current_page,
+    answers = excluded.answers,
+    checked = excluded.checked,
+    seed = excluded.seed
+"""
+SELECT_SQL = """
+SELECT updated_at, quiz_mode, current_page, answers, checked, seed
+FROM progress WHERE user_id = ? AND bank_version = ?
+"""
+EXISTS_SQL = """
+SELECT 1 FROM progress WHERE user_id = ? AND bank_version = ?
+"""
+# Journal rows are replayed in insertion (rowid) order
+INSERT_JOURNAL_SQL = """
+INSERT INTO progress_journal (user_id, bank_version, question, option, at) VALUES (?, ?, ?, ?, ?)
+"""
+SELECT_JOURNAL_SQL = """
+SELECT question, option, at FROM progress_journal
+WHERE user_id = ? AND bank_version = ? ORDER BY rowid
+"""
+DELETE_JOURNAL_SQL = """
+DELETE FROM progress_journal WHERE user_id = ? AND bank_version = ?
+"""
+
+
+class Progress:
+    """One user's saved state for one bank version"""
+
+    def __init__(self, answers, checked, quiz_mode='study', current_page=0, updated_at=None, seed=None):
+        self.answers = np.asarray(answers, dtype=np.int8)
+        self.checked = np.asarray(checked, dtype=bool)
+        self.quiz_mode = quiz_mode
+        self.current_page = current_page
+        self.updated_at = time.time() if updated_at is None else updated_at
+        # Option shuffle seed of the attempt (None for rows saved before seeds existed)
+        self.seed = seed
+
+    @classmethod
+    def empty(cls, size):
+        """An attempt with no answers, for replaying a journal that has no snapshot"""
+        return cls(np.full(size, UNANSWERED, dtype=np.int8), np.zeros(size, dtype=bool))
+
+    def to_row(self, user_id, bank_version):
+        return (user_id, bank_version, self.updated_at, self.quiz_mode, int(self.current_page),
+                self.answers.tobytes(), np.packbits(self.checked).tobytes(), self.seed)
+
+    @classmethod
+    def from_row(cls, row):
+        updated_at, quiz_mode, current_page, answers, checked, seed = row
+        answers = np.frombuffer(answers, dtype=np.int8).copy()
+        checked = np.unpackbits(np.frombuffer(checked, dtype=np.uint8), count=len(answers)).astype(bool)
+        return cls(answers, checked, quiz_mode, current_page, updated_at, seed)
+
+    def copy(self):
+        return Progress(self.answers.copy(), self.checked.copy(), self.quiz_mode, self.current_page,
+                        self.updated_at, self.seed)
+
+    def apply(self, deltas):
+        """Replay journaled (question, option code, time) changes in order"""
+        for question, code, at in deltas:
+            if 0 <= question < len(self.answers):
+                self.answers[question] = code
+                self.updated_at = max(self.updated_at, at)
+        return self
+
+
+class MemoryProgressStore:
+    """Progress kept in process memory only (lost on restart)"""
+
+    def __init__(self):
+        self._progress = {}
+        self._lock = threading.Lock()
+
+    def save(self, user_id, bank_version, progress: Progress):
+        with self._lock:
+            self._progress[(user_id, bank_version)] = progress.copy()
+
+    def append(self, user_id, bank_version, question, code, at=None, size=None):
+        with self._lock:
+            progress = self._progress.get((user_id, bank_version))
+            if progress is None and size is not None:
+                progress = self._progress[(user_id, bank_version)] = Progress.empty(size)
+            if progress is not None:
+                progress.apply([(question, code, time.time() if at is None else at)])
+
+    def load(self, user_id, bank_version, size=None) -> Optional[Progress]:
+        with self._lock:
+            progress = self._progress.get((user_id, bank_version))
+            return progress.copy() if progress is not None else None
+
+    def flush(self):
+        pass
+
+
+class SQLiteProgressStore:
+    """Progress in a SQLite database in WAL mode, written by one background thread"""
+
+    def __init__(self, path=PROGRESS_DB, read_pool_size=READ_POOL_SIZE):
+        self.path = path
+        self.read_pool_size = read_pool_size
+        self.last_error: Optional[Exception] = None
+        self.writes = 0
+        self.batches = 0
+        self.deltas = 0
+        self.compactions = 0
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._committing = {}
+        # Unsaved journal entries per key, with the times of their first and last change
+        self._journal = {}
+        self._journal_times = {}
+        self._journal_committing = {}
+        self._journal_rows = {}
+        # Bank size per key, for replaying a journal that has no snapshot yet
+        self._sizes = {}
+        self._flush_requested = False
+        self._writer = None
+        self._readers = None
+        self._init_lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, cached_statements=32)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # WAL with synchronous=NORMAL is crash-safe; only the last commits can be lost on power loss
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _ensure_open(self):
+        if self._writer is not None:
+            return
+        with self._init_lock:
+            if self._writer is not None:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = self._connect()
+            conn.executescript(SCHEMA)
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(progress)')}
+            for column, sql in MIGRATIONS.items():
+                if column not in columns:
+                    conn.execute(sql)
+            conn.commit()
+            self._readers = queue.LifoQueue()
+            for _ in range(self.read_pool_size):
+                self._readers.put(self._connect())
+            self._writer = threading.Thread(target=self._write_loop, args=(conn,),
+                                            name="progress-writer", daemon=True)
+            self._writer.start()
+
+    def save(self, user_id, bank_version, progress: Progress):
+        """Queue the latest progress for this key; earlier queued versions are dropped"""
+        self._ensure_open()
+        key = (user_id, bank_version)
+        with self._cond:
+            self._pending[key] = progress
+            # The snapshot already contains every change journaled before it
+            self._journal.pop(key, None)
+            self._journal_times.pop(key, None)
+            self._cond.notify_all()
+
+    def append(self, user_id, bank_version, question, code, at=None, size=None):
+        """Journal one answer change; written behind once the session goes quiet"""
+        self._ensure_open()
+        key = (user_id, bank_version)
+        now = time.time()
+        with self._cond:
+            if size is not None:
+                self._sizes[key] = size
+            self._journal.setdefault(key, []).append((question, code, now if at is None else at))
+            times = self._journal_times.get(key)
+            if times is None:
+                self._journal_times[key] = [now, now]
+                self._cond.notify_all()
+            else:
+                times[1] = now
+
+    def load(self, user_id, bank_version, size=None) -> Optional[Progress]:
+        """Latest progress; with no snapshot, the journal is replayed onto an empty attempt of ``size``"""
+        key = (user_id, bank_version)
+        with self._cond:
+            deltas = list(self._journal.get(key, ()))
+            progress = self._pending.get(key)
+            if progress is None:
+                # Journal entries being written are older than a queued snapshot, but newer than these
+                deltas = self._journal_committing.get(key, []) + deltas
+                progress = self._committing.get(key)
+        if progress is not None:
+            return progress.copy().apply(deltas)
+        self._ensure_open()
+        conn = self._readers.get()
+        try:
+            # One read transaction, so a compaction cannot slip in between the two reads
+            conn.execute('BEGIN')
+            try:
+                row = conn.execute(SELECT_SQL, key).fetchone()
+                journal = conn.execute(SELECT_JOURNAL_SQL, key).fetchall()
+            finally:
+                conn.execute('COMMIT')
+        finally:
+            self._readers.put(conn)
+        if row is None:
+            size = self._sizes.get(key) if size is None else size
+            if size is None or not (journal or deltas):
+                return None
+            return Progress.empty(size).apply(journal).apply(deltas)
+        # Entries still in memory may also have just been written; replaying them twice is harmless
+        return Progress.from_row(row).apply(journal).apply(deltas)
+
+    def flush(self):
+        """Wait until everything saved or journaled so far has been committed"""
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._pending or self._committing or self._journal or self._journal_committing:
+                self._cond.wait()
+
+    def _due_journals(self, now):
+        """Keys whose journal should be written now, and the time the next one is due"""
+        due = []
+        next_due = None
+        for key, (first, last) in self._journal_times.items():
+            when = min(last + AUTOSAVE_DEBOUNCE, first + AUTOSAVE_MAX_DELAY)
+            if self._flush_requested or when <= now:
+                due.append(key)
+            elif next_due is None or when < next_due:
+                next_due = when
+        return due, next_due
+
+    def _write_loop(self, conn):
+        while True:
+            with self._cond:
+                while True:
+                    due, next_due = self._due_journals(time.time())
+                    if self._pending or due:
+                        break
+                    self._flush_requested = False
+                    self._cond.wait(None if next_due is None else next_due - time.time())
+                self._committing, self._pending = self._pending, {}
+                self._journal_committing = {key: self._journal.pop(key) for key in due}
+                for key in due:
+                    del self._journal_times[key]
+                snapshots, journals = self._committing, self._journal_committing
+            try:
+                with conn:
+                    stored = self._write_batch(conn, snapshots, journals)
+                self.writes += len(snapshots)
+                self.deltas += sum(len(entries) for entries in journals.values())
+                self.batches += 1
+            except sqlite3.Error as e:
+                # Keep the writer alive; every save is a full state, so the next one for a key replaces it
+                self.last_error = e
+                stored = ()
+            with self._cond:
+                # A key with a committed snapshot row never needs its size to replay a journal again
+                for key in stored:
+                    self._sizes.pop(key, None)
+                self._committing = {}
+                self._journal_committing = {}
+                self._cond.notify_all()
+
+    def _write_batch(self, conn, snapshots, journals):
+        """Write one batch; returns the keys that now have a snapshot row"""
+        stored = list(snapshots)
+        if snapshots:
+            conn.executemany(DELETE_JOURNAL_SQL, list(snapshots))
+            conn.executemany(UPSERT_SQL, [progress.to_row(*key) for key, progress in snapshots.items()])
+            for key in snapshots:
+                self._journal_rows.pop(key, None)
+        if journals:
+            conn.executemany(INSERT_JOURNAL_SQL, [key + entry for key, entries in journals.items()
+                                                  for entry in entries])
+            for key, entries in journals.items():
+                rows = self._journal_rows[key] = self._journal_rows.get(key, 0) + len(entries)
+                if rows >= COMPACT_AFTER:
+                    if self._compact(conn, key):
+                        stored.append(key)
+                elif key in self._sizes:
+                    # A journal with no snapshot yet starts one at once, so its size need not be kept
+                    if conn.execute(EXISTS_SQL, key).fetchone() or self._compact(conn, key):
+                        stored.append(key)
+        return stored
+
+    def _compact(self, conn, key):
+        """Fold a session's journal into its snapshot (inside the writer's transaction)"""
+        row = conn.execute(SELECT_SQL, key).fetchone()
+        if row is not None:
+            progress = Progress.from_row(row)
+        elif key in self._sizes:
+            progress = Progress.empty(self._sizes[key])
+        else:
+            return False
+        progress.apply(conn.execute(SELECT_JOURNAL_SQL, key))
+        conn.execute(UPSERT_SQL, progress.to_row(*key))
+        conn.execute(DELETE_JOURNAL_SQL, key)
+        self._journal_rows.pop(key, None)
+        self.compactions += 1
+        return True
+
+    def stats(self):
+        """Counters for monitoring the write batching"""
+        with self._cond:
+            return {
+                'writes': self.writes,
+                'deltas': self.deltas,
+                'compactions': self.compactions,
+                'batches': self.batches,
+                'pending': len(self._pending),
+                'journaled': sum(len(entries) for entries in self._journal.values()),
+            }
+
+
+# Process-wide store shared by every session
+progress_store = SQLiteProgressStore()
@@ -0,0 +1,846 @@
+"""Compiled question bank format shared by both quiz apps.
+
+A raw CSV/XLSX bank is compiled once into an Arrow IPC file that already
+carries everything the apps derive per question: the cleaned option
+lists, the answer key as an option index, scenario groups and the
+paragraph splits of the question and scenario text. The file is opened
+through a memory map, so loading or swapping a bank is close to free no
+matter how large it is; pages are only read when a question is shown.
+
+Compilation works a record batch at a time, so a CSV export is parsed
+and compiled while it streams in (read_csv_batches + compile_batches)
+and peak memory stays close to the size of the compiled bank.
+
+Loaded banks are registered in a process-wide QuestionStore by version
+ID. Sessions only remember the version they are answering and look the
+bank up on each rerun, so the question text exists once per process
+instead of once per session. Scenario and hint text is dictionary
+encoded, so text repeated across a scenario group is stored once.
+
+Workbooks are read the same way, straight from the sheet XML in
+read-only mode, and may hold one paper or topic per tab.
+
+Compile a bank by hand with:
+
+    python question_bank.py questions.csv questions.arrow
+"""
+import csv
+import datetime
+import hashlib
+import io
+import os
+import posixpath
+import re
+import sys
+import threading
+import weakref
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+FORMAT_VERSION = '3'
+
+REQUIRED_COLUMNS = ['Question', 'OptionA', 'OptionB', 'OptionC', 'OptionD', 'CorrectAnswer']
+OPTION_COLUMNS = ['OptionA', 'OptionB', 'OptionC', 'OptionD']
+
+# Derived columns are prefixed so they never clash with sheet columns
+DERIVED_PREFIX = '__'
+# Optional sheet columns with heavily repeated values, stored dictionary encoded
+INTERNED_COLUMNS = ['Scenario', 'Hint', 'Topic']
+
+# Bytes of raw CSV parsed per record batch when streaming a bank in
+CSV_BLOCK_SIZE = 1 << 20
+# Bytes looked at to find the header row
+CSV_HEADER_PEEK = 1 << 16
+# Workbook rows per record batch
+XLSX_BATCH_ROWS = 4096
+
+# Day 0 of a workbook's date serials in the 1900 and 1904 date systems
+EXCEL_EPOCH_1900 = datetime.datetime(1899, 12, 30)
+EXCEL_EPOCH_1904 = datetime.datetime(1904, 1, 1)
+# Built-in number formats showing dates or times (ECMA-376 18.8.30), and elapsed time
+DATE_FORMAT_IDS = frozenset(range(14, 23)) | {45, 46, 47}
+DURATION_FORMAT_IDS = frozenset({46})
+
+
+def split_paragraphs(text):
+    """Split text on newlines into stripped, non-empty paragraphs"""
+    return [p.strip() for p in text.split('\n') if p.strip()]
+
+
+def clean_options(values):
+    """Drop empty option cells, keeping A-D order"""
+    return [opt for opt in values if opt and opt != 'nan' and opt.strip() != '']
+
+
+class RaggedRowError(ValueError):
+    """Raised when a CSV row has a different number of fields than the header"""
+
+
+class ValidationReport:
+    """Every issue found in a question bank, one row per issue"""
+
+    COLUMNS = ['Question', 'Severity', 'Check', 'Message']
+
+    def __init__(self, issues):
+        self.issues = issues
+
+    @property
+    def errors(self):
+        return self.issues[self.issues['Severity'] == 'error']
+
+    @property
+    def warnings(self):
+        return self.issues[self.issues['Severity'] == 'warning']
+
+    @property
+    def ok(self):
+        return self.errors.empty
+
+    def count(self, check):
+        return int((self.issues['Check'] == check).sum())
+
+
+def validate_frame(df):
+    """Check a whole bank at once and report every issue found.
+
+    Checks are column-wise array operations, so the cost is a handful of
+    passes over the frame regardless of how many rows have problems.
+    """
+    issues = []
+
+    def report(mask, severity, check, messages):
+        rows = np.flatnonzero(mask)
+        issues.extend((int(r) + 1, severity, check, messages(r)) for r in rows)
+
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing_columns:
+        issues.append((0, 'error', 'missing_columns', f"Missing required columns: {missing_columns}"))
+        return ValidationReport(pd.DataFrame(issues, columns=ValidationReport.COLUMNS))
+
+    frame = df[REQUIRED_COLUMNS].fillna('').astype(str)
+    answer = frame['CorrectAnswer'].to_numpy(dtype=object)
+    stripped_answer = frame['CorrectAnswer'].str.strip().to_numpy(dtype=object)
+    options = frame[OPTION_COLUMNS].to_numpy(dtype=object)
+    stripped = np.column_stack([frame[col].str.strip().to_numpy(dtype=object) for col in OPTION_COLUMNS])
+    present = (stripped != '') & (options != 'nan')
+
+    report(frame['Question'].str.strip().to_numpy() == '', 'warning', 'empty_question',
+           lambda r: "Question text is empty")
+
+    exact = ((options == answer[:, None]) & present).any(axis=1)
+    loose = ((stripped == stripped_answer[:, None]) & present).any(axis=1)
+    not_found = (answer != '') & ~exact
+    report(not_found & loose, 'error', 'whitespace_mismatch',
+           lambda r: f"Correct answer '{answer[r]}' only matches an option after trimming whitespace")
+    report(not_found & ~loose, 'error', 'answer_not_in_options',
+           lambda r: f"Correct answer '{answer[r]}' not found in options")
+
+    duplicate = np.zeros(len(frame), dtype=bool)
+    for a in range(len(OPTION_COLUMNS)):
+        for b in range(a + 1, len(OPTION_COLUMNS)):
+            duplicate |= present[:, a] & present[:, b] & (stripped[:, a] == stripped[:, b])
+    report(duplicate, 'warning', 'duplicate_options',
+           lambda r: f"Duplicate options: {[o for o in options[r] if o.strip()]}")
+
+    issues.sort(key=lambda issue: issue[0])
+    return ValidationReport(pd.DataFrame(issues, columns=ValidationReport.COLUMNS))
+
+
+class _BankCompiler:
+    """Compiles a bank one record batch at a time.
+
+    Every per-question column is derived from its own row, so a batch is
+    compiled as soon as it arrives. Only the scenario numbering and the
+    interned columns need to see the whole bank: they are kept as running
+    dictionaries (text -> code), and the group sizes are filled in by
+    finish() from the final counts.
+    """
+
+    def __init__(self, column_names):
+        missing_columns = [col for col in REQUIRED_COLUMNS if col not in column_names]
+        if missing_columns:
+            raise ValueError(f"Missing required columns: {missing_columns}")
+        self.sheet_columns = list(dict.fromkeys(list(column_names) + INTERNED_COLUMNS))
+        self.chunks = {name: [] for name in self.sheet_columns}
+        self.derived = {name: [] for name in ('options', 'correct_index', 'question_paragraphs',
+                                              'scenario_paragraphs', 'scenario_id', 'scenario_position')}
+        self.dictionaries = {col: {} for col in INTERNED_COLUMNS}
+        self.scenario_ids = {}
+        self.scenario_counts = []
+
+    def add(self, batch):
+        """Compile one batch of string columns (missing optional columns count as empty)"""
+        rows = batch.num_rows
+        columns = {}
+        for name in self.sheet_columns:
+            index = batch.schema.get_field_index(name)
+            columns[name] = batch.column(index) if index >= 0 else pa.array([''] * rows, pa.string())
+
+        for name in self.sheet_columns:
+            if name in self.dictionaries:
+                # Interned on the fly: repeated text is kept once, as a dictionary entry
+                dictionary = self.dictionaries[name]
+                codes = [dictionary.setdefault(value, len(dictionary)) for value in columns[name].to_pylist()]
+                self.chunks[name].append(pa.array(codes, pa.int32()))
+            else:
+                self.chunks[name].append(columns[name])
+
+        options = [clean_options(list(row)) for row in zip(*(columns[c].to_pylist() for c in OPTION_COLUMNS))]
+        correct_index = [
+            opts.index(answer) if answer in opts else -1
+            for opts, answer in zip(options, columns['CorrectAnswer'].to_pylist())
+        ]
+
+        # Scenario groups: rows sharing the same stripped scenario text, numbered
+        # in order of first appearance, with each row's position in its group
+        scenario = [text.strip() for text in columns['Scenario'].to_pylist()]
+        scenario_id = []
+        scenario_position = []
+        for text in scenario:
+            if text == '' or text == 'nan':
+                scenario_id.append(-1)
+                scenario_position.append(0)
+                continue
+            group = self.scenario_ids.setdefault(text, len(self.scenario_ids))
+            if group == len(self.scenario_counts):
+                self.scenario_counts.append(0)
+            self.scenario_counts[group] += 1
+            scenario_id.append(group)
+            scenario_position.append(self.scenario_counts[group])
+
+        derived = self.derived
+        derived['options'].append(pa.array(options, pa.list_(pa.string())))
+        derived['correct_index'].append(pa.array(correct_index, pa.int8()))
+        derived['question_paragraphs'].append(pa.array(
+            [split_paragraphs(q) for q in columns['Question'].to_pylist()], pa.list_(pa.string())))
+        derived['scenario_paragraphs'].append(pa.array([split_paragraphs(t) for t in scenario], pa.list_(pa.string())))
+        derived['scenario_id'].append(pa.array(scenario_id, pa.int32()))
+        derived['scenario_position'].append(pa.array(scenario_position, pa.int32()))
+
+    def _concat(self, chunks, type):
+        array = pa.concat_arrays(chunks) if chunks else pa.array([], type)
+        # Drop the batch copies as soon as the column is whole, so only one column is held twice
+        chunks.clear()
+        return array
+
+    def finish(self):
+        """The compiled table (without metadata; see stamp_bank)"""
+        columns = {}
+        for name in self.sheet_columns:
+            if name in self.dictionaries:
+                indices = self._concat(self.chunks[name], pa.int32())
+                columns[name] = pa.DictionaryArray.from_arrays(indices, pa.array(list(self.dictionaries[name]), pa.string()))
+            else:
+                columns[name] = self._concat(self.chunks[name], pa.string())
+
+        derived = {
+            'options': self._concat(self.derived['options'], pa.list_(pa.string())),
+            'correct_index': self._concat(self.derived['correct_index'], pa.int8()),
+            'question_paragraphs': self._concat(self.derived['question_paragraphs'], pa.list_(pa.string())),
+            'scenario_paragraphs': self._concat(self.derived['scenario_paragraphs'], pa.list_(pa.string())),
+            'scenario_id': self._concat(self.derived['scenario_id'], pa.int32()),
+            'scenario_position': self._concat(self.derived['scenario_position'], pa.int32()),
+        }
+        scenario_id = derived['scenario_id'].to_numpy(zero_copy_only=False)
+        counts = np.append(np.asarray(self.scenario_counts, dtype=np.int32), 0)
+        # -1 (no scenario) picks the trailing 0
+        derived['scenario_size'] = pa.array(counts[scenario_id], pa.int32())
+        for name in ('options', 'correct_index', 'question_paragraphs', 'scenario_paragraphs',
+                     'scenario_id', 'scenario_position', 'scenario_size'):
+            columns[DERIVED_PREFIX + name] = derived[name]
+        return pa.table(columns)
+
+
+def compile_batches(batches):
+    """Compile an iterable of record batches of string columns, consuming it as it goes.
+
+    Raises ValueError as soon as the first batch shows a required column
+    is missing, before the rest of the source is read.
+    """
+    compiler = None
+    for batch in batches:
+        if compiler is None:
+            compiler = _BankCompiler(batch.schema.names)
+        compiler.add(batch)
+    if compiler is None:
+        raise ValueError("The question bank has no header row")
+    return compiler.finish()
+
+
+def stamp_bank(table, content_hash, etag=None, last_modified=None):
+    """Attach the format version, content hash and cache validators to a compiled table"""
+    metadata = {
+        'format_version': FORMAT_VERSION,
+        'content_hash': content_hash,
+        'etag': etag or '',
+        'last_modified': last_modified or '',
+    }
+    return table.replace_schema_metadata(metadata)
+
+
+def compile_bank(df, content_hash, etag=None, last_modified=None):
+    """Compile a questions DataFrame into an Arrow table with derived columns"""
+    frame = df.fillna('').astype(str)
+    batch = pa.RecordBatch.from_pandas(frame, preserve_index=False)
+    return stamp_bank(compile_batches([batch]), content_hash, etag, last_modified)
+
+
+_RAGGED_ROW = re.compile(r'(?:Row #(?P<row>\d+): )?Expected (?P<expected>\d+) columns, got (?P<actual>\d+)')
+
+
+def _csv_header(stream):
+    """Column names of a CSV byte stream, read without consuming it"""
+    head = stream.peek(CSV_HEADER_PEEK)[:CSV_HEADER_PEEK].decode('utf-8-sig', errors='ignore')
+    return next(csv.reader(io.StringIO(head)), [])
+
+
+def read_csv_batches(stream, block_size=CSV_BLOCK_SIZE):
+    """Parse a CSV byte stream incrementally into record batches of string columns.
+
+    ``stream`` needs read() and peek(). Every column is read as text, exactly
+    as it appears in the sheet (empty cells are ''), so a column is never
+    re-typed halfway through a large bank. Only one block of raw CSV is held
+    at a time.
+
+    The CSV must be rectangular: a row with more or fewer fields than the
+    header raises RaggedRowError, since a streamed block cannot be padded.
+    compile_source falls back to pandas for local files with short rows.
+    """
+    header = _csv_header(stream)
+    try:
+        reader = pa_csv.open_csv(
+            stream,
+            read_options=pa_csv.ReadOptions(block_size=block_size, use_threads=False),
+            # Questions and scenarios have line breaks inside quoted cells
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={name: pa.string() for name in header},
+                strings_can_be_null=False,
+                quoted_strings_can_be_null=False,
+            ),
+        )
+        empty = True
+        for batch in reader:
+            empty = False
+            yield batch
+    except pa.ArrowInvalid as e:
+        match = _RAGGED_ROW.search(str(e))
+        if match is None:
+            raise
+        row = f"row {match['row']}" if match['row'] else "a row"
+        raise RaggedRowError(f"Question bank CSV rows must all have {match['expected']} fields like the "
+                             f"header; {row} has {match['actual']}") from e
+    if empty:
+        # Header only: still report the columns, so missing ones are caught
+        yield pa.RecordBatch.from_pydict({name: pa.array([], pa.string()) for name in reader.schema.names})
+
+
+def write_bank(table, path):
+    """Write a compiled bank atomically to path"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table.combine_chunks())
+    os.replace(tmp_path, path)
+
+
+def open_bank(path):
+    """Open a compiled bank through a memory map (no copy of the data)"""
+    source = pa.memory_map(path, 'r')
+    table = pa.ipc.open_file(source).read_all()
+    metadata = {k.decode(): v.decode() for k, v in (table.schema.metadata or {}).items()}
+    if metadata.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported question bank format in {path}")
+    return QuestionBank(table)
+
+
+class QuestionBank:
+    """Read-only view over a compiled question bank"""
+
+    def __init__(self, table):
+        self.table = table
+        metadata = {k.decode(): v.decode() for k, v in (table.schema.metadata or {}).items()}
+        self.content_hash = metadata.get('content_hash', '')
+        self.etag = metadata.get('etag') or None
+        self.last_modified = metadata.get('last_modified') or None
+        self._frame: Optional[pd.DataFrame] = None
+        self._validation: Optional[ValidationReport] = None
+        self._scenario_groups: Optional[List[tuple]] = None
+        self._derived_cache = {}
+        self._lock = threading.Lock()
+
+        self.correct_index = self._numpy('correct_index')
+        self.scenario_id = self._numpy('scenario_id')
+        self.scenario_position = self._numpy('scenario_position')
+        self.scenario_size = self._numpy('scenario_size')
+
+        # Topic codes come straight from the dictionary encoding ('' = no topic)
+        topic = self._column('Topic').combine_chunks()
+        self.topic_id = topic.indices.to_numpy(zero_copy_only=False)
+        self.topics = topic.dictionary.to_pylist()
+
+    def _column(self, name):
+        return self.table.column(name)
+
+    def _derived(self, name):
+        return self.table.column(DERIVED_PREFIX + name)
+
+    def _numpy(self, name):
+        return self._derived(name).to_numpy()
+
+    @property
+    def version(self):
+        """Short version ID derived from the content hash"""
+        return self.content_hash[:12]
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def question(self, i) -> str:
+        return self._column('Question')[i].as_py()
+
+    def question_paragraphs(self, i) -> List[str]:
+        return self._derived('question_paragraphs')[i].as_py()
+
+    def options(self, i) -> List[str]:
+        return self._derived('options')[i].as_py()
+
+    def correct_answer(self, i) -> str:
+        return self._column('CorrectAnswer')[i].as_py()
+
+    def scenario(self, i) -> str:
+        return self._column('Scenario')[i].as_py().strip()
+
+    def scenario_paragraphs(self, i) -> List[str]:
+        return self._derived('scenario_paragraphs')[i].as_py()
+
+    def hint(self, i) -> str:
+        return self._column('Hint')[i].as_py()
+
+    @property
+    def frame(self):
+        """The sheet columns as a DataFrame, built once per bank"""
+        with self._lock:
+            if self._frame is None:
+                names = [n for n in self.table.column_names if not n.startswith(DERIVED_PREFIX)]
+                self._frame = pd.DataFrame({n: self._column(n).to_pylist() for n in names})
+            return self._frame
+
+    def derived(self, name, build):
+        """Per-bank memo for data derived from this version (built once, shared)"""
+        with self._lock:
+            value = self._derived_cache.get(name)
+            if value is None:
+                value = self._derived_cache[name] = build(self)
+            return value
+
+    @property
+    def scenario_groups(self):
+        """Question indices of each scenario group, indexed by scenario id"""
+        with self._lock:
+            if self._scenario_groups is None:
+                order = np.argsort(self.scenario_id, kind='stable')
+                ids = self.scenario_id[order]
+                order = order[ids >= 0]
+                bounds = np.flatnonzero(np.diff(ids[ids >= 0])) + 1
+                groups = np.split(order, bounds) if len(order) else []
+                self._scenario_groups = [tuple(group.tolist()) for group in groups]
+            return self._scenario_groups
+
+    def scenario_members(self, i):
+        """Indices of the questions sharing question i's scenario (empty if none)"""
+        scenario_id = self.scenario_id[i]
+        return self.scenario_groups[scenario_id] if scenario_id >= 0 else ()
+
+    def caches(self):
+        """Lazily built per-bank caches that exist so far, by name (for memory accounting)"""
+        with self._lock:
+            caches = {'frame': self._frame, 'validation': self._validation, 'scenario_groups': self._scenario_groups}
+            caches.update(self._derived_cache)
+        return {name: value for name, value in caches.items() if value is not None}
+
+    @property
+    def validation(self):
+        """Validation report, computed once per bank and shared by all sessions"""
+        with self._lock:
+            if self._validation is None:
+                columns = {n: self._column(n).to_pylist() for n in REQUIRED_COLUMNS}
+                self._validation = validate_frame(pd.DataFrame(columns))
+            return self._validation
+
+
+class QuestionStore:
+    """Process-wide registry of read-only question banks keyed by version ID.
+
+    The ``max_versions`` most recently used banks are kept. An evicted bank
+    can still be looked up for as long as anything else (a session's answer
+    sheet) holds it, so a session is never cut off from the version it is
+    answering.
+    """
+
+    def __init__(self, max_versions=4):
+        self.max_versions = max_versions
+        self.latest_version: Optional[str] = None
+        self._banks = OrderedDict()
+        self._retired = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def publish(self, bank):
+        """Register a bank and make it the latest version"""
+        with self._lock:
+            self._banks[bank.version] = bank
+            self._banks.move_to_end(bank.version)
+            self.latest_version = bank.version
+            # Old versions are only kept for sessions still answering them
+            while len(self._banks) > self.max_versions:
+                version, retired = self._banks.popitem(last=False)
+                self._retired[version] = retired
+        return bank
+
+    def get(self, version) -> Optional[QuestionBank]:
+        """The bank for a version ID, or None if it is unknown or evicted and no longer in use"""
+        with self._lock:
+            bank = self._banks.get(version)
+            if bank is not None:
+                self._banks.move_to_end(version)
+                return bank
+            return self._retired.get(version)
+
+    def versions(self):
+        with self._lock:
+            return list(self._banks)
+
+    def banks(self):
+        """Every bank still in use: the kept ones oldest first, then evicted ones sessions still hold"""
+        with self._lock:
+            kept = list(self._banks.values())
+            return kept + [bank for bank in self._retired.values() if bank.version not in self._banks]
+
+
+# Shared by every session of both apps
+question_store = QuestionStore()
+
+
+def _local(tag):
+    """Tag name without its XML namespace (transitional and strict OOXML differ)"""
+    return tag.rpartition('}')[2]
+
+
+class _Tags:
+    """Fully qualified tag names of one XML part, so parsing compares plain strings"""
+
+    def __init__(self, root_tag):
+        ns = root_tag[:root_tag.index('}') + 1] if root_tag.startswith('{') else ''
+        self.sheet_data = ns + 'sheetData'
+        self.row = ns + 'row'
+        self.si = ns + 'si'
+        self.v = ns + 'v'
+        self.t = ns + 't'
+        self.r = ns + 'r'
+        self.inline = ns + 'is'
+
+
+def _xlsx_text(element, tags):
+    """Text of a shared or inline string, skipping phonetic (rPh) runs"""
+    parts = []
+    for child in element:
+        if child.tag == tags.t:
+            parts.append(child.text or '')
+        elif child.tag == tags.r:
+            parts.extend(t.text or '' for t in child if t.tag == tags.t)
+    return ''.join(parts)
+
+
+# Quoted literals and bracketed colours/locales, which say nothing about dates
+_FORMAT_LITERALS = re.compile(r'".*?"|\[(?!hh?\]|mm?\]|ss?\])[^\]]*\]')
+_DATE_CODES = re.compile(r'(?<![_\\])[dmhysDMHYS]')
+_DURATION_CODES = re.compile(r'\[hh?\](:mm(:ss(\.0*)?)?)?|\[mm?\](:ss(\.0*)?)?|\[ss?\](\.0*)?', re.I)
+
+
+def _date_format(code):
+    """None, 'date' or 'duration' for a number format code (its first section decides)"""
+    code = code.split(';')[0]
+    if _DURATION_CODES.search(code):
+        return 'duration'
+    if _DATE_CODES.search(_FORMAT_LITERALS.sub('', code)):
+        return 'date'
+    return None
+
+
+def _xlsx_date(text, duration, epoch):
+    """A date-formatted serial as read_excel showed it: a datetime, time or duration as text"""
+    value = float(text)
+    if duration:
+        return str(datetime.timedelta(milliseconds=round(value * 86_400_000)))
+    day, fraction = divmod(value, 1)
+    time_of_day = datetime.timedelta(milliseconds=round(fraction * 86_400_000))
+    if 0 <= value < 1 and time_of_day.days == 0:
+        return str((datetime.datetime.min + time_of_day).time())
+    if 0 < value < 60 and epoch == EXCEL_EPOCH_1900:
+        # Serials before March 1900 count Excel's non-existent 29 February 1900
+        day += 1
+    return str(epoch + datetime.timedelta(days=day) + time_of_day)
+
+
+def _xlsx_iso(text):
+    """An ISO 8601 date cell (t="d") as read_excel showed it; text it cannot parse is kept"""
+    try:
+        if 'T' in text or ' ' in text:
+            return str(datetime.datetime.fromisoformat(text))
+        if ':' in text:
+            return str(datetime.time.fromisoformat(text))
+        return str(datetime.date.fromisoformat(text))
+    except ValueError:
+        return text
+
+
+def _xlsx_number(text):
+    """A numeric cell as the sheet shows it (integral values without '.0')"""
+    try:
+        return str(int(text))
+    except ValueError:
+        value = float(text)
+        return str(int(value)) if value.is_integer() else str(value)
+
+
+_COLUMNS = {}
+
+
+def _column_index(ref):
+    """Zero-based column of a cell reference such as 'AB12'"""
+    letters = ref.rstrip('0123456789')
+    index = _COLUMNS.get(letters)
+    if index is None:
+        index = 0
+        for char in letters.upper():
+            index = index * 26 + ord(char) - 64
+        index = _COLUMNS[letters] = index - 1
+    return index
+
+
+class _Workbook:
+    """Read-only access to the parts of an XLSX package the loader needs"""
+
+    def __init__(self, path):
+        self.zip = zipfile.ZipFile(path)
+        targets = {}
+        shared_path = None
+        styles_path = 'xl/styles.xml'
+        with self.zip.open('xl/_rels/workbook.xml.rels') as f:
+            for rel in ET.parse(f).getroot():
+                target = rel.get('Target', '')
+                target = target.lstrip('/') if target.startswith('/') else posixpath.normpath(f"xl/{target}")
+                targets[rel.get('Id')] = target
+                if rel.get('Type', '').endswith('/sharedStrings'):
+                    shared_path = target
+                if rel.get('Type', '').endswith('/styles'):
+                    styles_path = target
+        self.sheets = []
+        self.epoch = EXCEL_EPOCH_1900
+        with self.zip.open('xl/workbook.xml') as f:
+            for element in ET.parse(f).getroot().iter():
+                tag = _local(element.tag)
+                if tag == 'sheet':
+                    rel_id = next(v for k, v in element.attrib.items() if _local(k) == 'id')
+                    self.sheets.append((element.get('name'), targets[rel_id]))
+                elif tag == 'workbookPr' and element.get('date1904') in ('1', 'true'):
+                    self.epoch = EXCEL_EPOCH_1904
+        self.shared_strings = self._read_shared_strings(shared_path)
+        self.date_styles = self._read_date_styles(styles_path)
+
+    def _read_shared_strings(self, path):
+        if path is None or path not in self.zip.namelist():
+            return []
+        strings = []
+        tags = None
+        with self.zip.open(path) as f:
+            for event, element in ET.iterparse(f, events=('start', 'end')):
+                if tags is None:
+                    tags = _Tags(element.tag)
+                elif event == 'end' and element.tag == tags.si:
+                    strings.append(_xlsx_text(element, tags))
+                    element.clear()
+        return strings
+
+    def _read_date_styles(self, path):
+        """Cell style indices (as in the s attribute) with a date format: whether it is a duration"""
+        if path not in self.zip.namelist():
+            return {}
+        with self.zip.open(path) as f:
+            root = ET.parse(f).getroot()
+        kinds = {}
+        for element in root.iter():
+            if _local(element.tag) == 'numFmt':
+                kinds[element.get('numFmtId')] = _date_format(element.get('formatCode', ''))
+        date_styles = {}
+        for cell_xfs in root:
+            if _local(cell_xfs.tag) != 'cellXfs':
+                continue
+            for index, xf in enumerate(cell_xfs):
+                format_id = xf.get('numFmtId', '0')
+                kind = kinds.get(format_id)
+                if kind is None and format_id not in kinds and int(format_id) in DATE_FORMAT_IDS:
+                    kind = 'duration' if int(format_id) in DURATION_FORMAT_IDS else 'date'
+                if kind is not None:
+                    date_styles[str(index)] = kind == 'duration'
+        return date_styles
+
+    def _cell(self, cell, tags):
+        kind = cell.get('t')
+        if kind == 'inlineStr':
+            inline = cell.find(tags.inline)
+            return _xlsx_text(inline, tags) if inline is not None else None
+        value = cell.findtext(tags.v)
+        if value is None:
+            return None
+        if kind == 's':
+            return self.shared_strings[int(value)]
+        if kind == 'b':
+            return 'True' if value == '1' else 'False'
+        if kind in ('str', 'e'):
+            return value
+        if kind == 'd':
+            return _xlsx_iso(value)
+        style = cell.get('s')
+        if style is not None and style in self.date_styles:
+            return _xlsx_date(value, self.date_styles[style], self.epoch)
+        return _xlsx_number(value)
+
+    def rows(self, path):
+        """Non-empty rows of a sheet as tuples of text (None for empty cells), streamed"""
+        tags = sheet_data = None
+        with self.zip.open(path) as f:
+            for event, element in ET.iterparse(f, events=('start', 'end')):
+                if event == 'start':
+                    if tags is None:
+                        tags = _Tags(element.tag)
+                    elif element.tag == tags.sheet_data:
+                        sheet_data = element
+                    continue
+                if element.tag != tags.row:
+                    continue
+                cells = {}
+                column = 0
+                for cell in element:
+                    ref = cell.get('r')
+                    if ref:
+                        column = _column_index(ref)
+                    value = self._cell(cell, tags)
+                    if value:
+                        cells[column] = value
+                    column += 1
+                # Parsed rows are dropped at once, so a sheet is never held whole
+                sheet_data.clear()
+                if cells:
+                    yield tuple(cells.get(i) for i in range(max(cells) + 1))
+
+    def close(self):
+        self.zip.close()
+
+
+def _xlsx_batch(rows, columns, positions, tab_topic):
+    data = {}
+    for name in columns:
+        i = positions.get(name)
+        values = [(row[i] or '') if i is not None and i < len(row) else '' for row in rows]
+        if name == 'Topic' and tab_topic:
+            values = [value or tab_topic for value in values]
+        data[name] = pa.array(values, pa.string())
+    return pa.RecordBatch.from_pydict(data)
+
+
+def read_xlsx_batches(path, batch_rows=XLSX_BATCH_ROWS):
+    """Stream the question rows of every sheet of a workbook as record batches of string columns.
+
+    Rows are parsed straight from the sheet XML as they are needed, without
+    building a cell object per cell or loading the whole workbook. Every
+    tab whose header row has the required columns contributes its rows (one
+    paper or topic per tab); other tabs, such as notes, are skipped. With
+    several question tabs, rows without a Topic take the tab name.
+    """
+    workbook = _Workbook(path)
+    try:
+        sheets = []
+        for title, sheet_path in workbook.sheets:
+            header = next(workbook.rows(sheet_path), ())
+            names = [(value or '').strip() for value in header]
+            if all(col in names for col in REQUIRED_COLUMNS):
+                sheets.append((title, sheet_path, names))
+        if not sheets:
+            raise ValueError(f"Missing required columns: no sheet in {os.path.basename(path)} "
+                             f"has all of {REQUIRED_COLUMNS}")
+
+        columns = list(dict.fromkeys(name for _, _, names in sheets for name in names if name))
+        by_tab = len(sheets) > 1
+        if by_tab and 'Topic' not in columns:
+            columns.append('Topic')
+
+        yielded = False
+        for title, sheet_path, names in sheets:
+            positions = {}
+            for i, name in enumerate(names):
+                if name:
+                    positions.setdefault(name, i)
+            tab_topic = title if by_tab else ''
+            rows = workbook.rows(sheet_path)
+            next(rows)  # header
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == batch_rows:
+                    yield _xlsx_batch(batch, columns, positions, tab_topic)
+                    yielded = True
+                    batch = []
+            if batch:
+                yield _xlsx_batch(batch, columns, positions, tab_topic)
+                yielded = True
+        if not yielded:
+            yield _xlsx_batch([], columns, {}, '')
+    finally:
+        workbook.close()
+
+
+def file_hash(path):
+    """SHA-256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def compile_source(path):
+    """Compile a CSV or XLSX bank file, streaming its rows (its hash is the bank version)"""
+    content_hash = file_hash(path)
+    if path.lower().endswith('.xlsx'):
+        table = compile_batches(read_xlsx_batches(path))
+    elif path.lower().endswith('.xls'):
+        # Legacy binary workbooks cannot be streamed; pandas reads them whole
+        return compile_bank(pd.read_excel(path), content_hash)
+    else:
+        try:
+            with open(path, 'rb', buffering=CSV_HEADER_PEEK) as f:
+                table = compile_batches(read_csv_batches(f))
+        except RaggedRowError:
+            # Short rows cannot be padded mid-stream; pandas reads the file whole
+            # and fills the missing cells with '', as the apps always have
+            return compile_bank(pd.read_csv(path, dtype=str, keep_default_na=False), content_hash)
+    return stamp_bank(table, content_hash)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit("usage: python question_bank.py <questions.csv|xlsx> <output.arrow>")
+    source_path, output_path = sys.argv[1:]
+    bank_table = compile_source(source_path)
+    write_bank(bank_table, output_path)
+    version = bank_table.schema.metadata[b'content_hash'].decode()[:12]
+    print(f"Compiled {bank_table.num_rows} questions to {output_path} (version {version})")
@@ -0,0 +1,250 @@
+"""Per-rerun phase timing for both quiz apps, exported in Prometheus text format.
+
+A script marks where each phase of a rerun starts:
+
+    timer = rerun_timer('one_pager')
+    timer.phase('css')
+    ...
+    timer.phase('load')
+    ...
+    timer.done()
+
+Each phase runs until the next one starts, so the script does not need to
+be restructured into ``with`` blocks. Fragments get their own timer with
+a ``scope`` of the fragment's name, since a fragment rerun does not run the
+script around it. Phases and whole reruns are timed with the monotonic
+perf_counter clock and aggregated into per-process histograms. A rerun cut
+short by st.rerun() or st.stop() keeps the phases it completed but is not
+counted as a whole rerun.
+
+The export also carries the counters of the process-wide services (bank
+fetches run and coalesced by the single-flight gate, exam deadlines, the
+progress store's write batching), read from their stats() when rendered.
+
+Metrics are off unless QUIZ_METRICS_PORT (serve /metrics on that local
+port) or QUIZ_METRICS_FILE (rewrite that file every few seconds) is set.
+When off, rerun_timer() returns a shared do-nothing timer, so the marks
+cost one method call each.
+"""
+import bisect
+import http.server
+import os
+import threading
+import time
+
+METRICS_PORT = int(os.environ.get('QUIZ_METRICS_PORT') or 0)
+METRICS_FILE = os.environ.get('QUIZ_METRICS_FILE')
+ENABLED = bool(METRICS_PORT or METRICS_FILE)
+# Seconds between rewrites of METRICS_FILE
+FILE_INTERVAL = 5
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PHASE_METRIC = 'quiz_rerun_phase_seconds'
+RERUN_METRIC = 'quiz_rerun_seconds'
+HELP = {
+    PHASE_METRIC: 'Time spent in each phase of a script or fragment rerun',
+    RERUN_METRIC: 'Time of complete script or fragment reruns',
+}
+
+# (metric, type, help, service, stats() key) for the process-wide services
+SERVICE_METRICS = [
+    ('quiz_bank_fetches_total', 'counter', 'Question bank fetches actually run', 'bank_fetch', 'executions'),
+    ('quiz_bank_fetches_coalesced_total', 'counter', 'Bank fetch requests that joined a fetch already in flight',
+     'bank_fetch', 'coalesced'),
+    ('quiz_bank_fetches_in_flight', 'gauge', 'Bank fetches running now', 'bank_fetch', 'in_flight'),
+    ('quiz_exam_deadlines_pending', 'gauge', 'Exam deadlines waiting in the scheduler', 'deadlines', 'pending'),
+    ('quiz_exam_deadlines_fired_total', 'counter', 'Exams closed by the deadline scheduler', 'deadlines', 'fired'),
+    ('quiz_exam_deadline_errors_total', 'counter', 'Deadline callbacks that raised', 'deadlines', 'errors'),
+    ('quiz_progress_snapshots_written_total', 'counter', 'Progress snapshots written', 'progress', 'writes'),
+    ('quiz_progress_deltas_written_total', 'counter', 'Journaled answer changes written', 'progress', 'deltas'),
+    ('quiz_progress_compactions_total', 'counter', 'Journals folded into their snapshot', 'progress', 'compactions'),
+    ('quiz_progress_write_batches_total', 'counter', 'Progress write transactions (group commits)',
+     'progress', 'batches'),
+    ('quiz_progress_pending', 'gauge', 'Progress snapshots queued for writing', 'progress', 'pending'),
+    ('quiz_progress_journaled', 'gauge', 'Answer changes waiting in journals', 'progress', 'journaled'),
+]
+
+
+def service_stats():
+    """stats() of the process-wide services, by service name"""
+    from bank_source import bank_cache
+    from exam_timer import deadline_scheduler
+    from progress_store import progress_store
+
+    return {
+        'bank_fetch': bank_cache.flight.stats(),
+        'deadlines': deadline_scheduler.stats(),
+        'progress': progress_store.stats(),
+    }
+
+
+class Histogram:
+    """Cumulative-bucket histogram as Prometheus expects it"""
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Process-wide histograms keyed by metric name and label values"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def render(self):
+        """All histograms in the Prometheus text exposition format"""
+        with self._lock:
+            items = sorted((key, list(h.counts), h.sum, h.count) for key, h in self._histograms.items())
+        lines = []
+        current = None
+        for (name, labels), counts, total, count in items:
+            if name != current:
+                current = name
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+            label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f"{name}_sum{{{label_text}}} {total:.6f}")
+            lines.append(f"{name}_count{{{label_text}}} {count}")
+        stats = service_stats()
+        for name, kind, help_text, service, key in SERVICE_METRICS:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {stats[service][key]}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class RerunTimer:
+    """Lap timer for one rerun of a script or fragment"""
+
+    __slots__ = ('app', 'scope', '_started', '_phase', '_phase_started')
+
+    def __init__(self, app, scope='script'):
+        self.app = app
+        self.scope = scope
+        self._started = self._phase_started = time.perf_counter()
+        self._phase = None
+
+    def phase(self, name):
+        """End the current phase (if any) and start ``name``"""
+        now = time.perf_counter()
+        self._end_phase(now)
+        self._phase = name
+        self._phase_started = now
+
+    def _end_phase(self, now):
+        if self._phase is not None:
+            labels = (('app', self.app), ('scope', self.scope), ('phase', self._phase))
+            registry.observe(PHASE_METRIC, labels, now - self._phase_started)
+            self._phase = None
+
+    def done(self):
+        """End the last phase and record the whole rerun"""
+        now = time.perf_counter()
+        self._end_phase(now)
+        registry.observe(RERUN_METRIC, (('app', self.app), ('scope', self.scope)), now - self._started)
+
+
+class _NullTimer:
+    """Stands in for RerunTimer while metrics are off"""
+
+    __slots__ = ()
+
+    def phase(self, name):
+        pass
+
+    def done(self):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+_exporter_lock = threading.Lock()
+_exporters_started = False
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def write_metrics_file(path):
+    """Write the current metrics to ``path`` atomically"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
+
+
+def _file_writer(path):
+    while True:
+        time.sleep(FILE_INTERVAL)
+        try:
+            write_metrics_file(path)
+        except OSError:
+            pass
+
+
+def _start_exporters():
+    global _exporters_started
+    with _exporter_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+        if METRICS_PORT:
+            try:
+                server = http.server.ThreadingHTTPServer(('127.0.0.1', METRICS_PORT), _MetricsHandler)
+            except OSError:
+                # Port taken (e.g. by the other app's process): keep recording, export via the file only
+                server = None
+            if server is not None:
+                threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        if METRICS_FILE:
+            threading.Thread(target=_file_writer, args=(METRICS_FILE,), name="metrics-file", daemon=True).start()
+
+
+def rerun_timer(app, scope='script'):
+    """A timer for the rerun that is starting (a no-op one while metrics are off)"""
+    if not ENABLED:
+        return NULL_TIMER
+    if not _exporters_started:
+        _start_exporters()
+    return RerunTimer(app, scope)
@@ -0,0 +1,241 @@
+"""Batch scoring engine shared by both quiz apps.
+
+Answers are graded as arrays instead of one question at a time: the
+answer key is the compiled ``correct_index`` column of the question
+bank, and a session's answers are encoded as option indices into an
+int8 array of the same length. A single vectorized pass then gives the
+total score plus per-scenario and per-topic breakdowns.
+
+AnswerSheet is where each session keeps its answers in that encoding
+in the first place, together with its checked flags and option order,
+and it memoizes the graded reports.
+"""
+import itertools
+import random
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+UNANSWERED = -1
+# Answer text that is not (or no longer) one of the question's options
+UNKNOWN_OPTION = -2
+
+
+class ScoreReport:
+    """Graded answers for one session"""
+
+    def __init__(self, bank, answer_codes, graded):
+        self.bank_version = bank.version
+        self.answered = (answer_codes >= 0) & graded
+        self.correct = self.answered & (answer_codes == bank.correct_index)
+        self.graded = graded
+
+        self.total = int(graded.sum())
+        self.answered_count = int(self.answered.sum())
+        self.correct_count = int(self.correct.sum())
+        self.percentage = (self.correct_count / self.total * 100) if self.total > 0 else 0
+
+        self.by_scenario = _breakdown(bank.scenario_id, graded, self.correct,
+                                      [f"Scenario {n + 1}" for n in range(len(bank.scenario_groups))])
+        self.by_topic = _breakdown(bank.topic_id, graded, self.correct, bank.topics)
+
+
+def _breakdown(group_ids, graded, correct, labels):
+    """Questions and correct answers per group, skipping ungrouped rows"""
+    if len(labels) == 0:
+        return pd.DataFrame(columns=['Group', 'Questions', 'Correct', 'Percentage'])
+    ids = np.where(group_ids >= 0, group_ids, len(labels))
+    questions = np.bincount(ids, weights=graded, minlength=len(labels) + 1)[:len(labels)]
+    right = np.bincount(ids, weights=correct, minlength=len(labels) + 1)[:len(labels)]
+    breakdown = pd.DataFrame({
+        'Group': labels,
+        'Questions': questions.astype(int),
+        'Correct': right.astype(int),
+    })
+    breakdown = breakdown[(breakdown['Questions'] > 0) & (breakdown['Group'] != '')]
+    breakdown['Percentage'] = breakdown['Correct'] / breakdown['Questions'] * 100
+    return breakdown.reset_index(drop=True)
+
+
+def grade(bank, answer_codes, graded=None):
+    """Grade encoded answers; ``graded`` restricts scoring to a subset of questions"""
+    if graded is None:
+        graded = np.ones(len(bank), dtype=bool)
+    return ScoreReport(bank, answer_codes, graded)
+
+
+def _cell_hash(q, code):
+    return hash((q, int(code)))
+
+
+def _state_hash(values, empty):
+    """XOR of the hashes of every cell that differs from ``empty``"""
+    h = 0
+    for q in np.flatnonzero(values != empty):
+        h ^= _cell_hash(q, values[q])
+    return h
+
+
+def _permutations(size):
+    """Every ordering of ``size`` options; a permutation code indexes this list"""
+    perms = _PERMUTATIONS.get(size)
+    if perms is None:
+        perms = _PERMUTATIONS[size] = list(itertools.permutations(range(size)))
+    return perms
+
+
+_PERMUTATIONS = {}
+_MASK64 = (1 << 64) - 1
+
+
+def _mix64(x):
+    """SplitMix64 finalizer: a fast, well-distributed 64-bit hash"""
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+def new_seed():
+    """A fresh attempt seed (63 bits, so it fits a signed SQLite INTEGER)"""
+    return random.getrandbits(63)
+
+
+def option_order(seed, q, size):
+    """The shuffled order of question q's ``size`` options for an attempt seed.
+
+    A pure function of (seed, question index), so the same attempt renders
+    the same order after a resume or on another worker without the order
+    ever being stored.
+    """
+    perms = _permutations(size)
+    return perms[_mix64(seed ^ _mix64(q)) % len(perms)]
+
+
+class AnswerSheet:
+    """One session's answers as compact arrays, graded with a memo.
+
+    Per question the sheet keeps one int8 option index (UNANSWERED, or
+    UNKNOWN_OPTION for text that is no longer an option) and one bit in
+    the checked bitset. Option order is not stored at all; it is derived
+    from the attempt's ``seed`` when a question is rendered. Option text
+    is never copied into the session; it is looked up in the shared bank.
+
+    Graded reports are memoized by an order-independent hash of the
+    answer state that is updated in O(1) per change, so reruns that do
+    not change any answer (and changes that are undone again) are served
+    from the memo without grading.
+    """
+
+    MEMO_SIZE = 8
+
+    def __init__(self, bank, codes=None, checked=None, seed=None):
+        size = len(bank)
+        self.bank_version = bank.version
+        # A reference, not a copy: keeps the (memory-mapped) bank alive and findable
+        # in the question store while this sheet still answers it
+        self.bank = bank
+        self.seed = new_seed() if seed is None else seed
+        self.codes = np.full(size, UNANSWERED, dtype=np.int8) if codes is None else np.array(codes, dtype=np.int8)
+        checked = np.zeros(size, dtype=bool) if checked is None else np.asarray(checked, dtype=bool)
+        self.checked_bits = np.packbits(checked)
+        self.answered_count = int((self.codes != UNANSWERED).sum())
+        self.checked_count = int(checked.sum())
+        self.answers_hash = _state_hash(self.codes, UNANSWERED)
+        self.checked_hash = _state_hash(checked, False)
+        self._memo = OrderedDict()
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the per-question arrays"""
+        return self.codes.nbytes + self.checked_bits.nbytes
+
+    def tracks(self, bank):
+        return self.bank_version == bank.version
+
+    def rebased(self, old_bank, bank):
+        """A sheet for a new version of the bank, keeping answers whose text still exists"""
+        codes = np.full(len(bank), UNANSWERED, dtype=np.int8)
+        checked = np.zeros(len(bank), dtype=bool)
+        for q in np.flatnonzero(self.codes >= 0):
+            if q < len(bank):
+                answer = old_bank.options(q)[self.codes[q]]
+                options = bank.options(q)
+                codes[q] = options.index(answer) if answer in options else UNKNOWN_OPTION
+                checked[q] = self.is_checked(q)
+        return AnswerSheet(bank, codes, checked, self.seed)
+
+    # --- Answers ---
+
+    def is_answered(self, q):
+        return self.codes[q] != UNANSWERED
+
+    def answer(self, q):
+        """Selected option index of question q, or None"""
+        code = int(self.codes[q])
+        return code if code >= 0 else None
+
+    def answer_text(self, bank, q, default=None):
+        """Selected option text, resolved from the shared bank"""
+        code = self.answer(q)
+        return bank.options(q)[code] if code is not None else default
+
+    def set_code(self, q, code):
+        """Record option index ``code`` for question q (UNANSWERED clears it), updating the hash in O(1)"""
+        old = self.codes[q]
+        if code != old:
+            # Unanswered cells are not part of the hash, as in _state_hash
+            if old == UNANSWERED:
+                self.answered_count += 1
+            else:
+                self.answers_hash ^= _cell_hash(q, old)
+            if code == UNANSWERED:
+                self.answered_count -= 1
+            else:
+                self.answers_hash ^= _cell_hash(q, code)
+            self.codes[q] = code
+
+    def answered(self):
+        return self.codes != UNANSWERED
+
+    # --- Checked flags (bitset) ---
+
+    def is_checked(self, q):
+        return bool(self.checked_bits[q >> 3] & (0x80 >> (q & 7)))
+
+    def set_checked(self, q, checked=True):
+        if self.is_checked(q) != checked:
+            self.checked_bits[q >> 3] ^= 0x80 >> (q & 7)
+            self.checked_hash ^= _cell_hash(q, True)
+            self.checked_count += 1 if checked else -1
+
+    @property
+    def checked(self):
+        """Checked flags as a bool array"""
+        return np.unpackbits(self.checked_bits, count=len(self.codes)).astype(bool)
+
+    # --- Option order ---
+
+    def option_order(self, bank, q, shuffle=True):
+        """Displayed order of question q's options as option indices (computed, never stored)"""
+        size = len(bank.options(q))
+        return option_order(self.seed, q, size) if shuffle else _permutations(size)[0]
+
+    # --- Grading ---
+
+    def report(self, bank, checked_only=False):
+        """Graded results for the current state, from the memo when possible"""
+        key = (bank.version, self.answers_hash, self.checked_hash if checked_only else None)
+        score = self._memo.get(key)
+        if score is None:
+            score = grade(bank, self.codes, self.checked if checked_only else None)
+            self._memo[key] = score
+            while len(self._memo) > self.MEMO_SIZE:
+                self._memo.popitem(last=False)
+        else:
+            self._memo.move_to_end(key)
+        return score